@@ -132,6 +132,18 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# yuxin 进度工作簿：单个文件、目录或二者组成的列表，多个工作簿时并行解析后合并
+YUXIN_WORKBOOKS = BASE_DIR / 'app_web' / 'yuxin_tiecheng' / 'TM整体进度表.xlsx'
+# yuxin 统计后端：pandas 读取工作簿；orm 读取 import_progress 命令导入数据库的数据
+# 多节点部署时 pandas 后端要求 YUXIN_WORKBOOKS 在各节点共享的存储上（上传只替换接收请求的节点上的文件），否则使用 orm
+YUXIN_BACKEND = 'pandas'
+# 工作簿变化后只按变化的行更新已有统计结果
+YUXIN_INCREMENTAL_REFRESH = True
+# 快照加载到内容变化的工作簿时记录版本（只保存变化的行），供 /api/yuxin/trend/ 使用
+YUXIN_RECORD_VERSIONS = True
+# 上传工作簿大小上限（字节）
+YUXIN_UPLOAD_MAX_SIZE = 50 * 1024 * 1024
+
 # 自定义用户模型
 AUTH_USER_MODEL = 'app_auth.User'
 
@@ -168,6 +180,23 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# jwt_required 进程内缓存的用户数和有效期（秒）；用户保存后通过 Django 缓存中的版本号失效，
+# 多进程部署时需配置各进程共享的 CACHES（如 Redis），否则其他进程最多在有效期后才看到修改
+AUTH_USER_CACHE_SIZE = 1024
+AUTH_USER_CACHE_TTL = 300
+# 进程内缓存的已验证 token 数，各 token 到其 exp 失效；登出吊销的 token 同样记在 CACHES 中
+AUTH_TOKEN_CACHE_SIZE = 4096
+# 缓存命中的 token 每隔多少秒到 CACHES 中确认一次是否被其他进程吊销
+AUTH_TOKEN_REVOCATION_CHECK_INTERVAL = 5
+# 登录次数、最后登录时间在内存中缓冲，每隔多少秒批量写回（0 为每次登录直接写回），
+# 缓冲的登录数达到上限时立即写回，进程异常退出最多丢失这么多次登录的统计
+AUTH_LOGIN_STATS_FLUSH_INTERVAL = 5
+AUTH_LOGIN_STATS_MAX_PENDING = 1000
+# 登录、注册、修改密码时计算密码哈希的进程数，None 为 CPU 核数
+AUTH_HASHER_WORKERS = None
+# 用户列表搜索方式：index 为 n-gram 索引表，fulltext 为 MySQL ngram 全文索引，like 为不走索引的 icontains
+AUTH_USER_SEARCH_MODE = 'index'
+
 
 # 支持跨域配置开始
 CORS_ORIGIN_ALLOW_ALL = True
@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class AppAuthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_auth'
+
+    def ready(self):
+        # 注册用户修改后失效认证缓存的信号
+        from . import authentication  # noqa: F401
+        # 注册用户保存后更新搜索索引的信号
+        from . import search  # noqa: F401
+        # 每次 login() 的 last_login 与登录次数一起由 login_stats 批量写回，替代 Django 的 update_last_login
+        from django.contrib.auth.models import update_last_login
+        from django.contrib.auth.signals import user_logged_in
+        from .login_stats import record_login
+        user_logged_in.disconnect(update_last_login, dispatch_uid='update_last_login')
+        user_logged_in.connect(record_login, dispatch_uid='app_auth_record_login')
@@ -0,0 +1,252 @@
+"""
+JWT 认证：进程内缓存已验证的 token 和已认证的用户对象，
+避免每个请求都解码验签、按主键查询用户表
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+User = get_user_model()
+
+
+def user_version_key(user_id):
+    """用户版本号在 Django 缓存中的 key"""
+    return f'auth_user_version:{user_id}'
+
+
+def user_version(user_id):
+    """用户当前版本号，从未修改过的用户为 0"""
+    return cache.get(user_version_key(user_id), 0)
+
+
+def bump_user_version(user_id):
+    """用户版本号加一，各进程缓存的该用户对象随之失效"""
+    key = user_version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # key 不存在（或已被淘汰）时从 1 开始，并发时只有一个 add 成功，其余再 incr
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+class UserCache:
+    """用户对象的 LRU 缓存，条目超过 ttl 秒或用户版本号变化后失效"""
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, user_id):
+        """命中时返回用户对象的副本（视图可能修改 request.user），未命中返回 None"""
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            user, version, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+        if version != user_version(user_id):
+            self.discard(user_id)
+            return None
+        return copy.copy(user)
+
+    def set(self, user_id, user, version):
+        """
+        version 须在查询用户之前读取：查询期间用户被修改时版本号已变化，
+        缓存的旧对象下次访问即失效
+        """
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[user_id] = (copy.copy(user), version, time.monotonic() + self.ttl)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def token_digest(raw_token):
+    """token 的摘要，作为缓存 key，不在内存中保存 token 原文"""
+    if isinstance(raw_token, str):
+        raw_token = raw_token.encode()
+    return hashlib.sha256(raw_token).digest()
+
+
+def revoked_token_key(jti):
+    """已吊销 token 在 Django 缓存中的 key"""
+    return f'auth_token_revoked:{jti}'
+
+
+def is_token_revoked(validated_token):
+    jti = validated_token.get(api_settings.JTI_CLAIM)
+    return jti is not None and cache.get(revoked_token_key(jti)) is not None
+
+
+class TokenCache:
+    """
+    已验证 token 的 LRU 缓存：token 摘要 -> (验证后的 token, exp, 上次检查吊销的时间)，
+    到 token 自身的 exp 即失效
+    """
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, digest):
+        """命中时返回 (验证后的 token, 上次检查吊销的时间)，未命中返回 None"""
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                return None
+            validated_token, exp, checked_at = entry
+            if exp <= time.time():
+                del self.entries[digest]
+                return None
+            self.entries.move_to_end(digest)
+            return validated_token, checked_at
+
+    def set(self, digest, validated_token, checked_at):
+        exp = validated_token.get('exp')
+        if self.max_size <= 0 or exp is None:
+            return
+        with self.lock:
+            self.entries[digest] = (validated_token, exp, checked_at)
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def discard(self, digest):
+        with self.lock:
+            self.entries.pop(digest, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    已验证的 token 和用户对象都缓存在进程内：同一 token 再次请求时不再解码、验签，
+    用户未命中缓存才查数据库；只缓存启用状态的用户
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.token_cache = TokenCache(max_size=getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 4096))
+        self.revocation_check_interval = getattr(settings, 'AUTH_TOKEN_REVOCATION_CHECK_INTERVAL', 5)
+        self.user_cache = UserCache(
+            max_size=getattr(settings, 'AUTH_USER_CACHE_SIZE', 1024),
+            ttl=getattr(settings, 'AUTH_USER_CACHE_TTL', 300),
+        )
+        # 本进程吊销的 token：jti -> exp
+        self.revoked = dict()
+
+    def get_validated_token(self, raw_token):
+        """
+        命中缓存时不再解码验签：本进程吊销的 token 立即拒绝，
+        其他进程吊销的 token 每隔 AUTH_TOKEN_REVOCATION_CHECK_INTERVAL 秒到 Django 缓存中确认一次
+        """
+        digest = token_digest(raw_token)
+        now = time.monotonic()
+        entry = self.token_cache.get(digest)
+        if entry is None:
+            validated_token, checked = super().get_validated_token(raw_token), False
+        else:
+            validated_token, checked_at = entry
+            checked = now - checked_at < self.revocation_check_interval
+        if validated_token.get(api_settings.JTI_CLAIM) in self.revoked or (
+                not checked and is_token_revoked(validated_token)):
+            self.token_cache.discard(digest)
+            raise InvalidToken('Token is revoked')
+        if not checked:
+            self.token_cache.set(digest, validated_token, now)
+        return validated_token
+
+    def revoke_token(self, validated_token):
+        """
+        吊销 token（如登出）：按 jti 记入 Django 缓存直到 token 过期，
+        共享缓存时其他进程最多 AUTH_TOKEN_REVOCATION_CHECK_INTERVAL 秒后也会拒绝该 token
+        """
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        if jti is None:
+            raise TokenError('Token has no id')
+        exp = validated_token.get('exp', 0)
+        cache.set(revoked_token_key(jti), True, timeout=max(int(exp - time.time()) + 1, 1))
+        self.token_cache.discard(token_digest(validated_token.token))
+        now = time.time()
+        self.revoked = {key: value for key, value in self.revoked.items() if value > now}
+        self.revoked[jti] = exp
+
+    def get_user(self, validated_token):
+        try:
+            user_id = str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        user = self.user_cache.get(user_id)
+        if user is None:
+            version = user_version(user_id)
+            user = super().get_user(validated_token)
+            self.user_cache.set(user_id, user, version)
+        elif api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+        return user
+
+    async def aget_user(self, validated_token):
+        """异步视图使用：命中缓存时直接返回，未命中再到线程中查库"""
+        user = None
+        if not api_settings.CHECK_REVOKE_TOKEN:
+            user = self.user_cache.get(str(validated_token.get(api_settings.USER_ID_CLAIM)))
+        if user is None:
+            user = await sync_to_async(self.get_user)(validated_token)
+        return user
+
+
+# 认证器无状态（缓存除外），各请求共用一个实例
+jwt_authentication = CachedJWTAuthentication()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    用户保存（含修改密码、禁用）或删除后失效缓存；事务提交后再失效一次，
+    避免提交前其他请求按旧数据重新填充缓存
+    注意 QuerySet.update() 不触发信号，这类修改最多在 AUTH_USER_CACHE_TTL 秒后生效
+    """
+    user_id = str(instance.pk)
+    jwt_authentication.user_cache.discard(user_id)
+    bump_user_version(user_id)
+
+    def on_commit():
+        jwt_authentication.user_cache.discard(user_id)
+        bump_user_version(user_id)
+    transaction.on_commit(on_commit)
@@ -0,0 +1,101 @@
+"""
+密码哈希放到进程池中计算：PBKDF2 故意很慢，在事件循环或请求线程中计算会占住 worker，
+多个进程并行计算，登录吞吐随 CPU 核数增长
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    进程池在第一次使用时创建，进程数 AUTH_HASHER_WORKERS，默认为 CPU 核数；
+    与工作簿解析相同使用 spawn，子进程按 DJANGO_SETTINGS_MODULE 读取 PASSWORD_HASHERS
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=getattr(settings, 'AUTH_HASHER_WORKERS', None) or os.cpu_count() or 1,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+    return _executor
+
+
+def verify_password(password, encoded):
+    """
+    在子进程中校验密码，哈希算法或迭代次数需要升级时一并计算新哈希
+    :return: (是否正确, 新哈希，不需要升级时为 None)
+    """
+    new_encoded = None
+
+    def setter(raw_password):
+        nonlocal new_encoded
+        new_encoded = make_password(raw_password)
+
+    return check_password(password, encoded, setter), new_encoded
+
+
+def reset_executor(executor):
+    """
+    丢弃已损坏的进程池（子进程崩溃或启动失败），下次使用时重建；
+    多个请求同时发现时只重建一次
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_in_hasher(func, *args):
+    """进程池损坏时换一个新进程池重试一次"""
+    executor = get_executor()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    except BrokenProcessPool:
+        reset_executor(executor)
+        return await asyncio.get_running_loop().run_in_executor(get_executor(), func, *args)
+
+
+async def amake_password(password):
+    return await run_in_hasher(make_password, password)
+
+
+async def acheck_password(user, password):
+    """与 User.check_password 相同，哈希需要升级时保存新哈希"""
+    if not user.has_usable_password():
+        return False
+    correct, new_encoded = await run_in_hasher(verify_password, password, user.password)
+    if correct and new_encoded is not None:
+        user.password = new_encoded
+        await user.asave(update_fields=['password'])
+    return correct
+
+
+async def aauthenticate(username, password):
+    """
+    与 ModelBackend.authenticate 相同：用户不存在时同样计算一次哈希，不通过响应时间暴露用户是否存在；
+    禁用的用户认证失败
+    """
+    # 子进程导入本模块时应用未加载，用户模型在调用时再取
+    from django.contrib.auth import get_user_model
+    User = get_user_model()
+    user = await User._default_manager.filter(**{User.USERNAME_FIELD: username}).afirst()
+    if user is None:
+        await amake_password(password)
+        return None
+    if await acheck_password(user, password) and user.is_active:
+        return user
+    return None
+
@@ -0,0 +1,131 @@
+"""
+登录统计的写缓冲：登录次数、最后登录时间先在内存中累加，定期合并为批量 UPDATE 写回，
+避免登录高峰时每次登录都更新用户行、在热点用户的行锁上排队
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+FLUSH_BATCH_SIZE = 500
+
+
+class LoginStatsBuffer:
+    """
+    按用户累加登录次数并保留最后一次登录时间；每 flush_interval 秒由后台线程写回，
+    缓冲的登录数达到 max_pending 时立即写回，进程退出时写回剩余部分，
+    进程异常退出最多丢失 max_pending 次登录的统计
+    """
+
+    def __init__(self, flush_interval=5, max_pending=1000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        # 用户 id -> [登录次数, 最后登录时间]
+        self.pending = dict()
+        self.pending_count = 0
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def record(self, user, login_time=None):
+        """
+        记录一次登录，同时更新内存中的用户对象（从库中读出的值加上本进程尚未写回的次数），
+        使本次响应中的登录信息与写回后一致
+        """
+        login_time = login_time or timezone.now()
+        user.last_login_time = login_time
+        user.last_login = login_time
+        if self.flush_interval <= 0:
+            user.login_count += 1
+            self.write({user.pk: [1, login_time]})
+            return
+        with self.lock:
+            entry = self.pending.setdefault(user.pk, [0, login_time])
+            entry[0] += 1
+            entry[1] = max(entry[1], login_time)
+            user.login_count += entry[0]
+            self.pending_count += 1
+            full = self.pending_count >= self.max_pending
+        self.start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """写回缓冲的统计，写入失败时放回缓冲等待下次写回"""
+        with self.lock:
+            pending, self.pending, self.pending_count = self.pending, dict(), 0
+        if not pending:
+            return
+        try:
+            self.write(pending)
+        except DatabaseError:
+            logger.exception('登录统计写回失败，%d 个用户的统计留待下次写回', len(pending))
+            with self.lock:
+                for user_id, (count, login_time) in pending.items():
+                    entry = self.pending.setdefault(user_id, [0, login_time])
+                    entry[0] += count
+                    entry[1] = max(entry[1], login_time)
+                    self.pending_count += count
+
+    @staticmethod
+    def write(pending):
+        """
+        每批用户一条 UPDATE：登录次数用 F() 在库中累加，多个进程同时写回不会互相覆盖；
+        最后登录时间取库中与缓冲中较晚的一个
+        """
+        items = list(pending.items())
+        with transaction.atomic():
+            for i in range(0, len(items), FLUSH_BATCH_SIZE):
+                batch = items[i:i + FLUSH_BATCH_SIZE]
+                counts = Case(*[When(pk=user_id, then=Value(count)) for user_id, (count, _) in batch])
+                times = Case(*[When(pk=user_id, then=Value(login_time)) for user_id, (_, login_time) in batch])
+                User.objects.filter(pk__in=[user_id for user_id, _ in batch]).update(
+                    login_count=F('login_count') + counts,
+                    last_login_time=Greatest(Coalesce('last_login_time', times), times),
+                    last_login=Greatest(Coalesce('last_login', times), times),
+                )
+
+    def start(self):
+        """第一次记录登录时启动后台写回线程"""
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, name='login-stats-flush', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+            # 后台线程的数据库连接不经过请求结束时的清理，用完即关
+            connection.close()
+
+    def stop(self):
+        """停止后台线程并写回剩余统计，进程退出时调用"""
+        self.stopped.set()
+        self.flush()
+
+
+def record_login(sender, request, user, **kwargs):
+    """
+    user_logged_in 的接收函数，替代 Django 的 update_last_login：
+    所有 login() 调用（接口登录、admin 登录等）都记入写缓冲，last_login 与登录次数一起写回
+    """
+    login_stats.record(user)
+
+
+login_stats = LoginStatsBuffer(
+    flush_interval=getattr(settings, 'AUTH_LOGIN_STATS_FLUSH_INTERVAL', 5),
+    max_pending=getattr(settings, 'AUTH_LOGIN_STATS_MAX_PENDING', 1000),
+)
+atexit.register(login_stats.stop)
@@ -0,0 +1,18 @@
+"""
+重建用户搜索索引：通过 QuerySet.update() 等不触发信号的方式修改了用户名、姓名、邮箱后执行
+python manage.py rebuild_user_search
+"""
+from django.core.management.base import BaseCommand
+
+from app_auth.search import User, index_user
+
+
+class Command(BaseCommand):
+    help = '按用户名、姓名、邮箱重建用户搜索索引（AUTH_USER_SEARCH_MODE = index 时使用）'
+
+    def handle(self, *args, **options):
+        total = 0
+        for user in User.objects.only('id', 'username', 'real_name', 'email').iterator():
+            index_user(user)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f'已重建 {total} 个用户的搜索索引'))
@@ -0,0 +1,75 @@
+# Generated by Django 5.0 on 2026-10-18 18:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_search_tokens(apps, schema_editor):
+    """为已有用户建立搜索索引（用户名、姓名、邮箱转小写后的单字和相邻两字）"""
+    User = apps.get_model('app_auth', 'User')
+    UserSearchToken = apps.get_model('app_auth', 'UserSearchToken')
+    objects = list()
+    for user_id, *values in User.objects.values_list('id', 'username', 'real_name', 'email').iterator():
+        tokens = set()
+        for text in values:
+            text = (text or '').lower()
+            tokens.update(text)
+            tokens.update(text[i:i + 2] for i in range(len(text) - 1))
+        objects.extend(UserSearchToken(user_id=user_id, token=token) for token in tokens)
+        if len(objects) >= 5000:
+            UserSearchToken.objects.bulk_create(objects, ignore_conflicts=True)
+            objects = list()
+    UserSearchToken.objects.bulk_create(objects, ignore_conflicts=True)
+
+
+def add_fulltext_index(apps, schema_editor):
+    """AUTH_USER_SEARCH_MODE = 'fulltext' 使用的全文索引，只在 MySQL 上创建"""
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            'ALTER TABLE `app_auth_user` ADD FULLTEXT INDEX `app_auth_user_search_ft` '
+            '(`username`, `real_name`, `email`) WITH PARSER ngram'
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('ALTER TABLE `app_auth_user` DROP INDEX `app_auth_user_search_ft`')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_auth', '0001_initial'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=2)),
+            ],
+            options={
+                'verbose_name': '用户搜索索引',
+                'verbose_name_plural': '用户搜索索引',
+                'db_table': 'app_auth_user_search_token',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['created_at', 'id'], name='app_auth_user_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='usersearchtoken',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='usersearchtoken',
+            constraint=models.UniqueConstraint(fields=('token', 'user'), name='app_auth_search_token_user_uniq'),
+        ),
+        migrations.RunPython(build_search_tokens, migrations.RunPython.noop),
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+    ]
@@ -51,3 +51,21 @@ class User(AbstractUser):
         db_table = "app_auth_user"
         verbose_name = "用户"
         verbose_name_plural = "用户"
+        indexes = [
+            # 用户列表按创建时间倒序的游标分页
+            models.Index(fields=["created_at", "id"], name="app_auth_user_created_idx"),
+        ]
+
+
+class UserSearchToken(models.Model):
+    """用户搜索索引：用户名、姓名、邮箱中的单字和相邻两字，由 app_auth.search 在用户保存时维护"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="search_tokens")
+    token = models.CharField(max_length=2)
+
+    class Meta:
+        db_table = "app_auth_user_search_token"
+        verbose_name = "用户搜索索引"
+        verbose_name_plural = "用户搜索索引"
+        constraints = [
+            models.UniqueConstraint(fields=["token", "user"], name="app_auth_search_token_user_uniq"),
+        ]
@@ -0,0 +1,168 @@
+"""
+用户搜索与游标分页：
+搜索先用索引取出候选用户，再用 icontains 确认，结果与直接 icontains 相同但不全表扫描；
+AUTH_USER_SEARCH_MODE 为 'index' 时用 n-gram 索引表（各数据库通用），
+'fulltext' 时用 MySQL 的 ngram 全文索引（由迁移创建），'like' 为不使用索引的 icontains
+"""
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Count, FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils.dateparse import parse_datetime
+
+from .models import UserSearchToken
+
+User = get_user_model()
+
+SEARCH_FIELDS = ('username', 'real_name', 'email')
+SEARCH_MODES = ('index', 'fulltext', 'like')
+# 用户列表排序：创建时间倒序，id 保证顺序唯一，与 app_auth_user_created_idx 对应
+USER_ORDERING = ('-created_at', '-id')
+# count=estimate 时带搜索条件的计数最多数到这么多行
+COUNT_ESTIMATE_LIMIT = 10000
+
+
+def text_tokens(text):
+    """文本（转小写）中的单字和相邻两字"""
+    text = (text or '').lower()
+    tokens = set(text)
+    tokens.update(text[i:i + 2] for i in range(len(text) - 1))
+    return tokens
+
+
+def query_tokens(term):
+    """查询词用到的 token：多于一个字时只用两字 token（更有区分度），单字查询用单字 token"""
+    term = term.lower()
+    if len(term) == 1:
+        return [term]
+    return list(dict.fromkeys(term[i:i + 2] for i in range(len(term) - 1)))
+
+
+def user_tokens(user):
+    tokens = set()
+    for field in SEARCH_FIELDS:
+        tokens |= text_tokens(getattr(user, field))
+    return tokens
+
+
+def index_user(user):
+    """按用户当前的用户名、姓名、邮箱更新搜索索引，只增删有变化的 token"""
+    tokens = user_tokens(user)
+    existing = set(UserSearchToken.objects.filter(user=user).values_list('token', flat=True))
+    if existing - tokens:
+        UserSearchToken.objects.filter(user=user, token__in=existing - tokens).delete()
+    UserSearchToken.objects.bulk_create(
+        [UserSearchToken(user=user, token=token) for token in tokens - existing], ignore_conflicts=True)
+
+
+@receiver(post_save, sender=User)
+def update_user_search_index(sender, instance, update_fields=None, **kwargs):
+    """只更新了登录信息、密码等非搜索字段时不需要重建索引"""
+    if update_fields is not None and not set(update_fields) & set(SEARCH_FIELDS):
+        return
+    index_user(instance)
+
+
+def search_users(queryset, search, mode=None):
+    """
+    筛选用户名、姓名或邮箱包含 search 的用户（不区分大小写）
+    :param mode: 搜索方式，默认为 settings.AUTH_USER_SEARCH_MODE
+    """
+    mode = mode or getattr(settings, 'AUTH_USER_SEARCH_MODE', 'index')
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"搜索方式只能是: {', '.join(SEARCH_MODES)}")
+    if mode == 'index':
+        tokens = query_tokens(search)
+        matched = UserSearchToken.objects.filter(token__in=tokens).values('user_id').annotate(
+            n=Count('token')).filter(n=len(tokens)).values('user_id')
+        queryset = queryset.filter(pk__in=matched)
+    elif mode == 'fulltext' and connection.vendor == 'mysql' and len(search) >= 2:
+        # 整个查询词作为短语匹配，ngram 解析器按两字切分，单字查询无法走全文索引
+        phrase = '"{}"'.format(search.replace('"', ' '))
+        queryset = queryset.alias(relevance=RawSQL(
+            'MATCH (`username`, `real_name`, `email`) AGAINST (%s IN BOOLEAN MODE)', [phrase],
+            output_field=FloatField(),
+        )).filter(relevance__gt=0)
+    return queryset.filter(Q(*[Q(**{f'{field}__icontains': search}) for field in SEARCH_FIELDS], _connector=Q.OR))
+
+
+def encode_cursor(user):
+    """下一页游标：最后一个用户的 (创建时间, id)"""
+    value = json.dumps([user.created_at.isoformat(), str(user.pk)])
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, user_id = json.loads(value)
+        created_at = parse_datetime(created_at)
+        user_id = User._meta.pk.to_python(user_id)
+    except (binascii.Error, ValueError, TypeError, ValidationError) as e:
+        raise ValueError('cursor 无效') from e
+    if created_at is None:
+        raise ValueError('cursor 无效')
+    return created_at, user_id
+
+
+def keyset_page(queryset, cursor, page_size):
+    """
+    游标分页：从游标位置沿 (created_at, id) 索引向后取 page_size 条，耗时与翻到第几页无关
+    :param cursor: 上一页返回的 next_cursor，第一页为空
+    :return: (用户列表, 下一页游标，没有下一页时为 None)
+    """
+    queryset = queryset.order_by(*USER_ORDERING)
+    if cursor:
+        created_at, user_id = decode_cursor(cursor)
+        queryset = queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=user_id)
+    users = list(queryset[:page_size + 1])
+    next_cursor = encode_cursor(users[page_size - 1]) if len(users) > page_size else None
+    return users[:page_size], next_cursor
+
+
+def count_users(queryset, mode='exact', filtered=False):
+    """
+    用户数
+    :param mode: 'exact' 精确计数，'estimate' 估算（没有搜索条件时取表统计信息，有搜索条件时最多数到
+                 COUNT_ESTIMATE_LIMIT），'none' 不计数
+    :param filtered: queryset 是否带搜索条件
+    :return: (数量，不计数时为 None, 是否为精确值)
+    """
+    if mode == 'none':
+        return None, False
+    if mode == 'estimate':
+        if not filtered:
+            estimate = table_rows_estimate(User._meta.db_table)
+            if estimate is not None:
+                return estimate, False
+        else:
+            total = queryset[:COUNT_ESTIMATE_LIMIT + 1].count()
+            if total > COUNT_ESTIMATE_LIMIT:
+                return COUNT_ESTIMATE_LIMIT, False
+            return total, True
+    return queryset.count(), True
+
+
+def table_rows_estimate(table):
+    """数据库统计信息中的表行数，不扫描表；不支持的数据库返回 None"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [table])
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
@@ -2,9 +2,9 @@ from rest_framework import serializers
 from django.contrib.auth import authenticate, get_user_model
 from django.core.exceptions import ValidationError
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.utils import timezone
 import uuid
 import secrets
+from .hashing import aauthenticate, acheck_password, amake_password
 
 User = get_user_model()
 
@@ -25,10 +25,7 @@ class LoginSerializer(serializers.Serializer):
             if not user.is_active:
                 raise serializers.ValidationError('用户账户已被禁用')
             
-            # 更新登录信息
-            user.login_count += 1
-            user.last_login_time = timezone.now()
-            user.save(update_fields=['login_count', 'last_login_time'])
+            # 登录次数、最后登录时间在 login() 时由 login_stats 记录
             
             attrs['user'] = user
             return attrs
@@ -46,6 +43,26 @@ class LoginSerializer(serializers.Serializer):
         }
 
 
+class AsyncLoginSerializer(LoginSerializer):
+    """异步登录序列化器：is_valid 只检查字段，用户名密码由 avalidate_credentials 在进程池中校验"""
+
+    def validate(self, attrs):
+        return attrs
+
+    async def avalidate_credentials(self):
+        """
+        :return: 与 is_valid 相同格式的错误，没有错误时为空字典
+        """
+        user = await aauthenticate(self.validated_data['username'], self.validated_data['password'])
+        if not user:
+            return {'non_field_errors': ['用户名或密码错误']}
+        self.validated_data['user'] = user
+        return dict()
+
+    async def asave(self):
+        return self.create(self.validated_data)
+
+
 class RegisterSerializer(serializers.ModelSerializer):
     """用户注册序列化器"""
     password = serializers.CharField(write_only=True, min_length=8, 
@@ -108,6 +125,46 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 
+class AsyncRegisterSerializer(RegisterSerializer):
+    """异步注册序列化器：is_valid 只检查格式，用户名、邮箱是否已存在由 avalidate_unique 检查"""
+
+    class Meta(RegisterSerializer.Meta):
+        # 去掉模型唯一约束生成的 UniqueValidator（同步查库）
+        extra_kwargs = {'username': {'validators': []}}
+
+    def validate_username(self, value):
+        if len(value) < 3:
+            raise serializers.ValidationError('用户名至少3位')
+        return value
+
+    def validate_email(self, value):
+        return value
+
+    async def avalidate_unique(self):
+        """
+        :return: 与 is_valid 相同格式的错误，没有错误时为空字典
+        """
+        errors = dict()
+        if await User.objects.filter(username=self.validated_data['username']).aexists():
+            errors['username'] = ['用户名已存在']
+        if await User.objects.filter(email=self.validated_data['email']).aexists():
+            errors['email'] = ['邮箱已被注册']
+        return errors
+
+    async def asave(self):
+        """与 create_user 相同，密码哈希在进程池中计算"""
+        validated_data = dict(self.validated_data)
+        validated_data.pop('password_confirm')
+        password = validated_data.pop('password')
+        validated_data['salt'] = secrets.token_hex(8)
+        validated_data['username'] = User.normalize_username(validated_data['username'])
+        validated_data['email'] = User.objects.normalize_email(validated_data['email'])
+        user = User(**validated_data)
+        user.password = await amake_password(password)
+        await user.asave()
+        return user
+
+
 class UserSerializer(serializers.ModelSerializer):
     """用户信息序列化器"""
     user_role_display = serializers.CharField(source='get_user_role_display', read_only=True)
@@ -139,6 +196,13 @@ class UserProfileSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('手机号必须是11位')
         return value
 
+    def update(self, instance, validated_data):
+        """只保存本次修改的字段，不把实例上的其他字段写回"""
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
 
 class PasswordChangeSerializer(serializers.Serializer):
     """修改密码序列化器"""
@@ -175,6 +239,29 @@ class PasswordChangeSerializer(serializers.Serializer):
         return user
 
 
+class AsyncPasswordChangeSerializer(PasswordChangeSerializer):
+    """异步修改密码序列化器：旧密码由 avalidate_old_password 在进程池中校验"""
+
+    def validate_old_password(self, value):
+        return value
+
+    async def avalidate_old_password(self):
+        """
+        :return: 与 is_valid 相同格式的错误，没有错误时为空字典
+        """
+        user = self.context['request'].user
+        if not await acheck_password(user, self.validated_data['old_password']):
+            return {'old_password': ['旧密码错误']}
+        return dict()
+
+    async def asave(self):
+        """request.user可能来自认证缓存，重新读取后只更新密码"""
+        user = await User.objects.aget(pk=self.context['request'].user.pk)
+        user.password = await amake_password(self.validated_data['new_password'])
+        await user.asave(update_fields=['password'])
+        return user
+
+
 class TokenRefreshSerializer(serializers.Serializer):
     """Token刷新序列化器"""
     refresh = serializers.CharField()
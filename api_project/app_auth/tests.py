@@ -1,3 +1,206 @@
+import base64
+import json
+import os
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import hashing
+from .authentication import jwt_authentication, revoked_token_key
+from .login_stats import login_stats
+from .models import User
+from .search import USER_ORDERING, search_users
+
+
+class AuthTestCase(TestCase):
+    """认证相关测试的公共部分：登录统计只在测试中显式写回，不启动后台线程"""
+
+    password = 'abc12345'
+
+    def setUp(self):
+        patcher = mock.patch.object(login_stats, 'start')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(login_stats.flush)
+        self.user = User.objects.create_user(username='tester', email='tester@example.com', password=self.password)
+
+    def post_json(self, url, data, **headers):
+        return self.client.post(url, json.dumps(data), content_type='application/json', **headers)
+
+    def login(self, username='tester', password=None):
+        response = self.post_json('/api/auth/login', {'username': username, 'password': password or self.password})
+        self.assertEqual(response.status_code, 200, response.content)
+        return {'HTTP_AUTHORIZATION': 'Bearer ' + response.json()['data']['access_token']}
+
+
+class UserCacheWriteTests(AuthTestCase):
+    """认证缓存中的用户对象不能写回数据库"""
+
+    def test_profile_update_keeps_login_counters(self):
+        headers = self.login()
+        # 用户对象进入认证缓存，之后的登录只更新数据库
+        self.assertEqual(self.client.get('/api/auth/userinfo', **headers).status_code, 200)
+        self.login()
+        login_stats.flush()
+
+        response = self.client.put('/api/auth/userinfo', json.dumps({'real_name': '张三'}),
+                                   content_type='application/json', **headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.real_name, '张三')
+        self.assertEqual(self.user.login_count, 2)
+        self.assertIsNotNone(self.user.last_login_time)
+        self.assertIsNotNone(self.user.last_login)
+        self.assertEqual(response.json()['data']['login_count'], 2)
+
+    def test_password_change_keeps_other_columns(self):
+        headers = self.login()
+        self.assertEqual(self.client.get('/api/auth/userinfo', **headers).status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(real_name='李四', login_count=5)
+
+        response = self.post_json('/api/auth/password/change', {
+            'old_password': self.password, 'new_password': 'xyz12345', 'new_password_confirm': 'xyz12345',
+        }, **headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('xyz12345'))
+        self.assertEqual(self.user.real_name, '李四')
+        self.assertEqual(self.user.login_count, 5)
+
+
+class HasherPoolTests(AuthTestCase):
+    """密码哈希进程池损坏后自动重建"""
+
+    def test_login_after_worker_crash(self):
+        self.login()
+        # 杀掉子进程后进程池进入 broken 状态
+        executor = hashing.get_executor()
+        for process in list(executor._processes.values()):
+            os.kill(process.pid, 9)
+            process.join()
+        with self.assertRaises(Exception):
+            executor.submit(os.getpid).result()
+        self.login()
+        self.assertIsNot(hashing.get_executor(), executor)
+        self.assertTrue(async_to_sync(hashing.run_in_hasher)(hashing.verify_password, self.password,
+                                                            self.user.password)[0])
+
+
+class LoginStatsTests(AuthTestCase):
+    """登录统计先缓冲再批量写回"""
+
+    def test_api_login_counts_once(self):
+        self.login()
+        self.login()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.login_count, 0)
+        login_stats.flush()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.login_count, 2)
+        self.assertEqual(self.user.last_login, self.user.last_login_time)
+
+    def test_session_login_updates_last_login(self):
+        self.assertTrue(self.client.login(username='tester', password=self.password))
+        login_stats.flush()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.login_count, 1)
+        self.assertIsNotNone(self.user.last_login)
+
+    def test_flush_adds_to_concurrent_updates(self):
+        login_stats.record(self.user)
+        User.objects.filter(pk=self.user.pk).update(login_count=10)
+        login_stats.flush()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.login_count, 11)
+
+    def test_buffer_flushes_when_full(self):
+        buffer = type(login_stats)(flush_interval=60, max_pending=3)
+        with mock.patch.object(buffer, 'start'):
+            for _ in range(2):
+                buffer.record(User.objects.get(pk=self.user.pk))
+            self.assertEqual(User.objects.get(pk=self.user.pk).login_count, 0)
+            buffer.record(User.objects.get(pk=self.user.pk))
+        self.assertEqual(User.objects.get(pk=self.user.pk).login_count, 3)
+        self.assertEqual(buffer.pending_count, 0)
+
+
+class AuthCacheTests(AuthTestCase):
+    """认证缓存中的用户、token 在修改或吊销后失效"""
+
+    def test_cached_user_invalidated_on_save(self):
+        headers = self.login()
+        self.assertEqual(self.client.get('/api/auth/userinfo', **headers).status_code, 200)
+        self.assertIsNotNone(jwt_authentication.user_cache.get(str(self.user.pk)))
+
+        user = User.objects.get(pk=self.user.pk)
+        user.real_name = '王五'
+        user.save()
+        response = self.client.get('/api/auth/userinfo', **headers)
+        self.assertEqual(response.json()['data']['real_name'], '王五')
+
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.client.get('/api/auth/userinfo', **headers).status_code, 401)
+
+    def test_logout_revokes_cached_token(self):
+        headers = self.login()
+        self.assertEqual(self.client.get('/api/auth/userinfo', **headers).status_code, 200)
+        self.assertEqual(self.client.post('/api/auth/logout', **headers).status_code, 200)
+        self.assertEqual(self.client.get('/api/auth/userinfo', **headers).status_code, 401)
+
+    def test_token_revoked_by_other_process(self):
+        headers = self.login()
+        self.assertEqual(self.client.get('/api/auth/userinfo', **headers).status_code, 200)
+        # 其他进程吊销时只写入共享缓存，本进程到检查间隔后才确认
+        token = AccessToken(headers['HTTP_AUTHORIZATION'].split()[1])
+        cache.set(revoked_token_key(token['jti']), True)
+        self.addCleanup(cache.delete, revoked_token_key(token['jti']))
+        self.assertEqual(self.client.get('/api/auth/userinfo', **headers).status_code, 200)
+        with mock.patch.object(jwt_authentication, 'revocation_check_interval', 0):
+            self.assertEqual(self.client.get('/api/auth/userinfo', **headers).status_code, 401)
+
+
+class UserListTests(AuthTestCase):
+    """用户列表的游标分页与搜索"""
+
+    def setUp(self):
+        super().setUp()
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        for i in range(23):
+            User.objects.create_user(username=f'member{i:02d}', email=f'member{i:02d}@example.com')
+        # 部分用户创建时间相同，翻页须按 id 区分
+        created_at = timezone.now()
+        ids = list(User.objects.values_list('pk', flat=True)[:10])
+        User.objects.filter(pk__in=ids).update(created_at=created_at)
+        self.headers = self.login()
+
+    def pages(self, **params):
+        ids, cursor = list(), ''
+        while cursor is not None:
+            response = self.client.get('/api/auth/users', {'cursor': cursor, 'page_size': 5, **params},
+                                       **self.headers)
+            self.assertEqual(response.status_code, 200, response.content)
+            data = response.json()['data']
+            ids += [user['id'] for user in data['users']]
+            cursor = data['pagination']['next_cursor']
+        return ids
+
+    def test_keyset_pages_cover_all_users_in_order(self):
+        expected = [str(pk) for pk in User.objects.order_by(*USER_ORDERING).values_list('pk', flat=True)]
+        self.assertEqual(self.pages(), expected)
+
+    def test_keyset_pages_with_search(self):
+        expected = [str(pk) for pk in search_users(User.objects.all(), 'member1', mode='like').order_by(
+            *USER_ORDERING).values_list('pk', flat=True)]
+        self.assertEqual(len(expected), 10)
+        self.assertEqual(self.pages(search='member1'), expected)
 
-# Create your tests here.
+    def test_invalid_cursor(self):
+        well_formed = base64.urlsafe_b64encode(json.dumps(['2024-01-01T00:00:00+00:00', 'abc']).encode()).decode()
+        for cursor in ['not-a-cursor', well_formed]:
+            response = self.client.get('/api/auth/users', {'cursor': cursor}, **self.headers)
+            self.assertEqual(response.status_code, 400, cursor)
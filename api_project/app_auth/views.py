@@ -1,23 +1,56 @@
 import json
-from django.contrib.auth import login, logout, authenticate, get_user_model
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth import logout, authenticate, get_user_model, alogin
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
-from django.db import models
+from django.db import IntegrityError
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
-from .serializers import (LoginSerializer, RegisterSerializer, UserSerializer, 
-                         TokenRefreshSerializer, UserProfileSerializer, 
-                         PasswordChangeSerializer)
+from rest_framework_simplejwt.exceptions import TokenError, InvalidToken, AuthenticationFailed
+from .serializers import (UserSerializer, TokenRefreshSerializer, UserProfileSerializer,
+                         AsyncLoginSerializer, AsyncRegisterSerializer, AsyncPasswordChangeSerializer)
+from .authentication import jwt_authentication
+from .search import USER_ORDERING, count_users, keyset_page, search_users
 from functools import wraps
 from django.utils import timezone
 
 User = get_user_model()
 
 
+async def ajwt_authenticate(request):
+    """异步视图的JWT认证：成功时设置request.user并返回None，失败时返回401响应"""
+    auth_header = request.META.get('HTTP_AUTHORIZATION')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return JsonResponse({
+            'code': 401,
+            'msg': '缺少认证token'
+        }, status=401)
+
+    token = auth_header.split(' ')[1]
+    try:
+        validated_token = jwt_authentication.get_validated_token(token)
+        request.user = await jwt_authentication.aget_user(validated_token)
+        request.auth = validated_token
+    except (TokenError, InvalidToken, AuthenticationFailed) as e:
+        return JsonResponse({
+            'code': 401,
+            'msg': 'Token无效或已过期'
+        }, status=401)
+    return None
+
+
 def jwt_required(view_func):
-    """JWT认证装饰器"""
+    """JWT认证装饰器，支持同步和异步视图函数"""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapped_view(request, *args, **kwargs):
+            response = await ajwt_authenticate(request)
+            if response is not None:
+                return response
+            return await view_func(request, *args, **kwargs)
+        return async_wrapped_view
+
     @wraps(view_func)
     def wrapped_view(request, *args, **kwargs):
         auth_header = request.META.get('HTTP_AUTHORIZATION')
@@ -29,35 +62,39 @@ def jwt_required(view_func):
         
         token = auth_header.split(' ')[1]
         try:
-            # 验证token
-            from rest_framework_simplejwt.authentication import JWTAuthentication
-            jwt_auth = JWTAuthentication()
-            validated_token = jwt_auth.get_validated_token(token)
-            request.user = jwt_auth.get_user(validated_token)
-            return view_func(request, *args, **kwargs)
-        except (TokenError, InvalidToken) as e:
+            # 验证token，用户对象优先取进程内缓存
+            validated_token = jwt_authentication.get_validated_token(token)
+            request.user = jwt_authentication.get_user(validated_token)
+            request.auth = validated_token
+        except (TokenError, InvalidToken, AuthenticationFailed) as e:
             return JsonResponse({
                 'code': 401,
                 'msg': 'Token无效或已过期'
             }, status=401)
+        return view_func(request, *args, **kwargs)
     
     return wrapped_view
 
 
 @method_decorator(csrf_exempt, name='dispatch')
 class LoginView(View):
-    """用户登录视图"""
+    """用户登录视图（异步，密码在进程池中校验）"""
     
-    def post(self, request):
+    async def post(self, request):
         """用户登录接口"""
         try:
             data = json.loads(request.body)
-            serializer = LoginSerializer(data=data)
+            serializer = AsyncLoginSerializer(data=data)
             
             if serializer.is_valid():
-                result = serializer.save()
+                errors = await serializer.avalidate_credentials()
+            else:
+                errors = serializer.errors
+            
+            if not errors:
+                result = await serializer.asave()
                 user = result['user']
-                login(request, user)
+                await alogin(request, user)
                 
                 # 返回JWT tokens和用户信息
                 user_serializer = UserSerializer(user)
@@ -76,7 +113,7 @@ class LoginView(View):
                 return JsonResponse({
                     'code': 400,
                     'msg': '登录失败',
-                    'errors': serializer.errors
+                    'errors': errors
                 }, status=400)
                 
         except json.JSONDecodeError:
@@ -95,15 +132,12 @@ class LoginView(View):
 class LogoutView(View):
     """用户登出视图"""
     
-    @jwt_required
+    @method_decorator(jwt_required)
     def post(self, request):
         """用户登出接口"""
         try:
-            # 将refresh token加入黑名单
-            auth_header = request.META.get('HTTP_AUTHORIZATION')
-            if auth_header and auth_header.startswith('Bearer '):
-                # 这里可以进一步处理token黑名单
-                pass
+            # 吊销当前access token，之后使用该token的请求返回401
+            jwt_authentication.revoke_token(request.auth)
             
             logout(request)
             return JsonResponse({
@@ -119,17 +153,27 @@ class LogoutView(View):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class RegisterView(View):
-    """用户注册视图"""
+    """用户注册视图（异步，密码在进程池中哈希）"""
     
-    def post(self, request):
+    async def post(self, request):
         """用户注册接口"""
         try:
             data = json.loads(request.body)
-            serializer = RegisterSerializer(data=data)
+            serializer = AsyncRegisterSerializer(data=data)
             
             if serializer.is_valid():
-                user = serializer.save()
-                
+                errors = await serializer.avalidate_unique()
+            else:
+                errors = serializer.errors
+            
+            if not errors:
+                try:
+                    user = await serializer.asave()
+                except IntegrityError:
+                    # 检查之后被其他请求抢先注册
+                    errors = await serializer.avalidate_unique() or {'username': ['用户名已存在']}
+            
+            if not errors:
                 # 注册成功后自动登录并返回token
                 refresh = RefreshToken.for_user(user)
                 user_serializer = UserSerializer(user)
@@ -149,7 +193,7 @@ class RegisterView(View):
                 return JsonResponse({
                     'code': 400,
                     'msg': '注册失败',
-                    'errors': serializer.errors
+                    'errors': errors
                 }, status=400)
             
         except json.JSONDecodeError:
@@ -168,7 +212,7 @@ class RegisterView(View):
 class UserInfoView(View):
     """获取用户信息视图"""
     
-    @jwt_required
+    @method_decorator(jwt_required)
     def get(self, request):
         """获取当前登录用户信息"""
         user_serializer = UserSerializer(request.user)
@@ -178,13 +222,14 @@ class UserInfoView(View):
             'data': user_serializer.data
         })
     
-    @jwt_required
+    @method_decorator(jwt_required)
     def put(self, request):
         """更新用户资料"""
         try:
             data = json.loads(request.body)
+            # request.user可能来自认证缓存，写库前重新读取
             serializer = UserProfileSerializer(
-                instance=request.user, 
+                instance=User.objects.get(pk=request.user.pk), 
                 data=data, 
                 partial=True
             )
@@ -257,20 +302,28 @@ class TokenRefreshView(View):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class PasswordChangeView(View):
-    """修改密码视图"""
+    """修改密码视图（异步，密码在进程池中校验和哈希）"""
     
-    @jwt_required
-    def post(self, request):
+    async def post(self, request):
         """修改密码"""
+        # method_decorator 包装后不再是协程函数，异步方法中直接认证
+        response = await ajwt_authenticate(request)
+        if response is not None:
+            return response
         try:
             data = json.loads(request.body)
-            serializer = PasswordChangeSerializer(
+            serializer = AsyncPasswordChangeSerializer(
                 data=data,
                 context={'request': request}
             )
             
             if serializer.is_valid():
-                serializer.save()
+                errors = await serializer.avalidate_old_password()
+            else:
+                errors = serializer.errors
+            
+            if not errors:
+                await serializer.asave()
                 return JsonResponse({
                     'code': 200,
                     'msg': '密码修改成功'
@@ -279,7 +332,7 @@ class PasswordChangeView(View):
                 return JsonResponse({
                     'code': 400,
                     'msg': '密码修改失败',
-                    'errors': serializer.errors
+                    'errors': errors
                 }, status=400)
                 
         except json.JSONDecodeError:
@@ -298,7 +351,7 @@ class PasswordChangeView(View):
 class UserListView(View):
     """用户列表视图（管理员功能）"""
     
-    @jwt_required
+    @method_decorator(jwt_required)
     def get(self, request):
         """获取用户列表"""
         # 检查是否是管理员
@@ -313,21 +366,39 @@ class UserListView(View):
             page = int(request.GET.get('page', 1))
             page_size = int(request.GET.get('page_size', 10))
             search = request.GET.get('search', '')
+            # 传cursor（第一页为空字符串）时使用游标分页
+            cursor = request.GET.get('cursor')
+            # 计数方式：exact 精确计数，estimate 估算，none 不计数
+            count = request.GET.get('count', 'exact')
+            if page < 1 or page_size < 1 or count not in ('exact', 'estimate', 'none'):
+                raise ValueError('page、page_size须为正整数，count只能是exact、estimate、none')
             
-            # 构建查询
+            # 构建查询，搜索先走索引再确认包含关系
             queryset = User.objects.all()
             if search:
-                queryset = queryset.filter(
-                    models.Q(username__icontains=search) |
-                    models.Q(real_name__icontains=search) |
-                    models.Q(email__icontains=search)
-                )
+                queryset = search_users(queryset, search)
+            total, total_exact = count_users(queryset, count, filtered=bool(search))
             
             # 分页
-            total = queryset.count()
-            start = (page - 1) * page_size
-            end = start + page_size
-            users = queryset[start:end]
+            if cursor is not None:
+                users, next_cursor = keyset_page(queryset, cursor, page_size)
+                pagination = {
+                    'page_size': page_size,
+                    'total': total,
+                    'total_exact': total_exact,
+                    'next_cursor': next_cursor
+                }
+            else:
+                start = (page - 1) * page_size
+                end = start + page_size
+                users = queryset.order_by(*USER_ORDERING)[start:end]
+                pagination = {
+                    'page': page,
+                    'page_size': page_size,
+                    'total': total,
+                    'total_exact': total_exact,
+                    'pages': None if total is None else (total + page_size - 1) // page_size
+                }
             
             # 序列化
             user_serializer = UserSerializer(users, many=True)
@@ -337,17 +408,17 @@ class UserListView(View):
                 'msg': '获取用户列表成功',
                 'data': {
                     'users': user_serializer.data,
-                    'pagination': {
-                        'page': page,
-                        'page_size': page_size,
-                        'total': total,
-                        'pages': (total + page_size - 1) // page_size
-                    }
+                    'pagination': pagination
                 }
             })
             
+        except ValueError as e:
+            return JsonResponse({
+                'code': 400,
+                'msg': f'参数错误: {str(e)}'
+            }, status=400)
         except Exception as e:
             return JsonResponse({
                 'code': 500,
                 'msg': f'获取用户列表失败: {str(e)}'
-            }, status=500)
\ No newline at end of file
+            }, status=500)
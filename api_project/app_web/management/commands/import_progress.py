@@ -0,0 +1,32 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""
+:author: keane
+:file  import_progress.py
+:time  2026/10/18 15:48
+:desc  将进度工作簿的“新版”“上线内容”sheet 导入数据库
+       python manage.py import_progress [工作簿或目录 ...] [--batch-size 500]
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app_web.yuxin_tiecheng.data_orm import IMPORT_BATCH_SIZE, import_frames
+from app_web.yuxin_tiecheng.data_web import WORKBOOK_PATH, load_projects_frames
+
+
+class Command(BaseCommand):
+    help = "导入进度工作簿到数据库（按来源项目、行号 upsert），供 YUXIN_BACKEND = 'orm' 使用"
+
+    def add_arguments(self, parser):
+        parser.add_argument("workbooks", nargs="*", help="工作簿文件或目录，默认为 settings.YUXIN_WORKBOOKS")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="每批写入行数")
+
+    def handle(self, *args, **options):
+        workbooks = options["workbooks"] or getattr(settings, "YUXIN_WORKBOOKS", WORKBOOK_PATH)
+        try:
+            frames = load_projects_frames(workbooks)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"读取工作簿失败: {e}")
+        result = import_frames(frames, batch_size=options["batch_size"])
+        for model_name, total in result.items():
+            self.stdout.write(self.style.SUCCESS(f"{model_name}: 导入 {total} 行"))
@@ -0,0 +1,29 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""
+:author: keane
+:file  import_questions.py
+:time  2026/10/18 18:40
+:desc  将题库工作簿的单选题、多选题、判断题导入数据库
+       python manage.py import_questions [题库路径] [--batch-size 500]
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from app_web.question_answer.question_answer import IMPORT_BATCH_SIZE, import_questions, load_question_frames
+
+
+class Command(BaseCommand):
+    help = "导入题库到数据库（按题型、题型内序号 upsert），供题目列表和随机组卷接口使用"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", help="题库工作簿，默认为 settings.QUESTION_BANK_PATH 或自带题库")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="每批写入行数")
+
+    def handle(self, *args, **options):
+        try:
+            frames = load_question_frames(options["path"])
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"读取题库失败: {e}")
+        result = import_questions(frames, batch_size=options["batch_size"])
+        for question_type, total in result.items():
+            self.stdout.write(self.style.SUCCESS(f"{question_type}: 导入 {total} 题"))
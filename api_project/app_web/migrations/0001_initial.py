@@ -0,0 +1,89 @@
+# Generated by Django 5.0 on 2026-10-18 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Release',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_project', models.CharField(max_length=100, verbose_name='来源项目')),
+                ('row_no', models.PositiveIntegerField(verbose_name='行号')),
+                ('release_month', models.CharField(blank=True, max_length=20, null=True, verbose_name='上线月份')),
+                ('release_date', models.DateTimeField(blank=True, null=True, verbose_name='上线日期')),
+                ('epic_code', models.CharField(blank=True, max_length=50, null=True, verbose_name='Epic')),
+                ('story_code', models.CharField(blank=True, max_length=50, null=True, verbose_name='Story')),
+                ('zentao', models.CharField(blank=True, max_length=100, null=True, verbose_name='禅道')),
+                ('project', models.CharField(blank=True, max_length=100, null=True, verbose_name='所属项目')),
+                ('project_module', models.CharField(blank=True, max_length=100, null=True, verbose_name='所属模块')),
+                ('release_type', models.CharField(blank=True, max_length=20, null=True, verbose_name='上线类型')),
+                ('release_content', models.TextField(blank=True, null=True, verbose_name='上线内容')),
+                ('related_story', models.CharField(blank=True, max_length=100, null=True, verbose_name='关联需求Story编号')),
+                ('owner', models.CharField(blank=True, max_length=50, null=True, verbose_name='责任人')),
+            ],
+            options={
+                'verbose_name': '上线内容',
+                'verbose_name_plural': '上线内容',
+                'db_table': 'app_web_release',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProgressTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_project', models.CharField(max_length=100, verbose_name='来源项目')),
+                ('row_no', models.PositiveIntegerField(verbose_name='行号')),
+                ('project', models.CharField(blank=True, max_length=100, null=True, verbose_name='所属项目')),
+                ('epic_code', models.CharField(blank=True, max_length=50, null=True, verbose_name='Epic编号')),
+                ('story_code', models.CharField(blank=True, max_length=50, null=True, verbose_name='Story编号')),
+                ('project_module', models.CharField(blank=True, max_length=100, null=True, verbose_name='所属模块')),
+                ('function_describe', models.TextField(blank=True, null=True, verbose_name='功能点描述')),
+                ('exploit_progress', models.FloatField(blank=True, null=True, verbose_name='开发已完成进度')),
+                ('plan_start_date', models.DateTimeField(blank=True, null=True, verbose_name='计划开始日期')),
+                ('plan_end_date', models.DateTimeField(blank=True, null=True, verbose_name='计划完成日期')),
+                ('real_start_date', models.DateTimeField(blank=True, null=True, verbose_name='实际开始日期')),
+                ('real_end_date', models.DateTimeField(blank=True, null=True, verbose_name='实际完成日期')),
+                ('plan_submit_test_date', models.DateTimeField(blank=True, null=True, verbose_name='计划提交测试日期')),
+                ('real_submit_test_date', models.DateTimeField(blank=True, null=True, verbose_name='实际提交测试日期')),
+                ('plan_line_date', models.DateTimeField(blank=True, null=True, verbose_name='预计上线日期')),
+                ('real_line_date', models.DateTimeField(blank=True, null=True, verbose_name='实际上线日期')),
+                ('real_exploiter', models.CharField(blank=True, max_length=50, null=True, verbose_name='开发人员')),
+                ('start_date_sit', models.DateTimeField(blank=True, null=True, verbose_name='实际SIT开始时间')),
+                ('end_date_sit', models.DateTimeField(blank=True, null=True, verbose_name='实际SIT结束时间')),
+                ('start_date_uat', models.DateTimeField(blank=True, null=True, verbose_name='实际UAT开始时间')),
+                ('end_date_uat', models.DateTimeField(blank=True, null=True, verbose_name='实际UAT结束时间')),
+                ('test_person', models.CharField(blank=True, max_length=50, null=True, verbose_name='测试人员')),
+                ('task_status', models.CharField(blank=True, max_length=50, null=True, verbose_name='任务状态')),
+            ],
+            options={
+                'verbose_name': '进度任务',
+                'verbose_name_plural': '进度任务',
+                'db_table': 'app_web_progress_task',
+                'indexes': [models.Index(fields=['task_status'], name='idx_progress_task_status'), models.Index(fields=['real_exploiter'], name='idx_progress_task_exploiter'), models.Index(fields=['project_module'], name='idx_progress_task_module'), models.Index(fields=['story_code'], name='idx_progress_task_story')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='progresstask',
+            constraint=models.UniqueConstraint(fields=('source_project', 'row_no'), name='uniq_progress_task_row'),
+        ),
+        migrations.AddIndex(
+            model_name='release',
+            index=models.Index(fields=['story_code', 'release_type'], name='idx_release_story_type'),
+        ),
+        migrations.AddIndex(
+            model_name='release',
+            index=models.Index(fields=['release_date'], name='idx_release_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='release',
+            constraint=models.UniqueConstraint(fields=('source_project', 'row_no'), name='uniq_release_row'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.0 on 2026-10-18 18:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_web', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgressVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=32, verbose_name='内容摘要')),
+                ('loaded_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='加载时间')),
+                ('row_count', models.PositiveIntegerField(verbose_name='行数')),
+                ('added_count', models.PositiveIntegerField(default=0, verbose_name='新增行数')),
+                ('removed_count', models.PositiveIntegerField(default=0, verbose_name='删除行数')),
+                ('parent', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='child', to='app_web.progressversion', verbose_name='上一版本')),
+            ],
+            options={
+                'verbose_name': '进度版本',
+                'verbose_name_plural': '进度版本',
+                'db_table': 'app_web_progress_version',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProgressVersionRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sign', models.SmallIntegerField(verbose_name='增减')),
+                ('row_hash', models.BigIntegerField(verbose_name='行内容哈希')),
+                ('source_project', models.CharField(blank=True, max_length=100, null=True, verbose_name='来源项目')),
+                ('story_code', models.CharField(blank=True, max_length=50, null=True, verbose_name='Story编号')),
+                ('task_status', models.CharField(blank=True, max_length=50, null=True, verbose_name='任务状态')),
+                ('exploit_progress', models.FloatField(blank=True, null=True, verbose_name='开发已完成进度')),
+                ('data', models.JSONField(verbose_name='行数据')),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='app_web.progressversion', verbose_name='版本')),
+            ],
+            options={
+                'verbose_name': '进度版本变化行',
+                'verbose_name_plural': '进度版本变化行',
+                'db_table': 'app_web_progress_version_row',
+                'indexes': [models.Index(fields=['row_hash'], name='idx_version_row_hash')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0 on 2026-10-18 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_web', '0002_progress_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Question',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_type', models.CharField(choices=[('single', '单选题'), ('multiple', '多选题'), ('judge', '判断题')], max_length=20, verbose_name='题型')),
+                ('type_no', models.PositiveIntegerField(verbose_name='题型内序号')),
+                ('name', models.TextField(verbose_name='题目')),
+                ('answer', models.CharField(blank=True, default='', max_length=10, verbose_name='答案')),
+                ('options', models.JSONField(default=list, verbose_name='选项')),
+                ('score', models.PositiveSmallIntegerField(default=2, verbose_name='分值')),
+            ],
+            options={
+                'verbose_name': '题目',
+                'verbose_name_plural': '题目',
+                'db_table': 'app_web_question',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='question',
+            constraint=models.UniqueConstraint(fields=('question_type', 'type_no'), name='uniq_question_type_no'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0 on 2026-10-18 18:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_web', '0003_question'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkbookUpload',
+            fields=[
+                ('id', models.CharField(max_length=32, primary_key=True, serialize=False, verbose_name='任务ID')),
+                ('name', models.CharField(max_length=255, verbose_name='工作簿')),
+                ('size', models.BigIntegerField(verbose_name='文件大小')),
+                ('status', models.CharField(choices=[('pending', '等待解析'), ('parsing', '解析中'), ('done', '完成'), ('failed', '失败')], default='pending', max_length=20, verbose_name='状态')),
+                ('reason', models.TextField(blank=True, default='', verbose_name='失败原因')),
+                ('rows', models.JSONField(blank=True, null=True, verbose_name='各sheet行数')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='上传时间')),
+            ],
+            options={
+                'verbose_name': '工作簿上传',
+                'verbose_name_plural': '工作簿上传',
+                'db_table': 'app_web_workbook_upload',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+import os
+
+from django.db import migrations
+
+
+def import_question_bank(apps, schema_editor):
+    """
+    部署后题目表为空时导入题库（默认为自带题库），题目列表、组卷、判分接口不必等手动执行 import_questions
+    表中已有题目时不覆盖
+    """
+    from app_web.question_answer.question_answer import import_questions, load_question_frames, question_bank_path
+
+    Question = apps.get_model("app_web", "Question")
+    path = question_bank_path()
+    if Question.objects.exists() or not os.path.exists(path):
+        return
+    import_questions(load_question_frames(path), model=Question)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_web', '0004_workbook_upload'),
+    ]
+
+    operations = [
+        migrations.RunPython(import_question_bank, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,183 @@
 from django.db import models
+from django.utils import timezone
+
 
 # Create your models here.
+
+class ProgressTask(models.Model):
+    """进度表“新版”sheet 的一行（story 下的一条开发任务）"""
+    # 来源工作簿及行号，作为导入时的唯一键
+    source_project = models.CharField(max_length=100, verbose_name="来源项目")
+    row_no = models.PositiveIntegerField(verbose_name="行号")
+
+    project = models.CharField(max_length=100, blank=True, null=True, verbose_name="所属项目")
+    epic_code = models.CharField(max_length=50, blank=True, null=True, verbose_name="Epic编号")
+    story_code = models.CharField(max_length=50, blank=True, null=True, verbose_name="Story编号")
+    project_module = models.CharField(max_length=100, blank=True, null=True, verbose_name="所属模块")
+    function_describe = models.TextField(blank=True, null=True, verbose_name="功能点描述")
+    exploit_progress = models.FloatField(blank=True, null=True, verbose_name="开发已完成进度")
+    plan_start_date = models.DateTimeField(blank=True, null=True, verbose_name="计划开始日期")
+    plan_end_date = models.DateTimeField(blank=True, null=True, verbose_name="计划完成日期")
+    real_start_date = models.DateTimeField(blank=True, null=True, verbose_name="实际开始日期")
+    real_end_date = models.DateTimeField(blank=True, null=True, verbose_name="实际完成日期")
+    plan_submit_test_date = models.DateTimeField(blank=True, null=True, verbose_name="计划提交测试日期")
+    real_submit_test_date = models.DateTimeField(blank=True, null=True, verbose_name="实际提交测试日期")
+    plan_line_date = models.DateTimeField(blank=True, null=True, verbose_name="预计上线日期")
+    real_line_date = models.DateTimeField(blank=True, null=True, verbose_name="实际上线日期")
+    real_exploiter = models.CharField(max_length=50, blank=True, null=True, verbose_name="开发人员")
+    start_date_sit = models.DateTimeField(blank=True, null=True, verbose_name="实际SIT开始时间")
+    end_date_sit = models.DateTimeField(blank=True, null=True, verbose_name="实际SIT结束时间")
+    start_date_uat = models.DateTimeField(blank=True, null=True, verbose_name="实际UAT开始时间")
+    end_date_uat = models.DateTimeField(blank=True, null=True, verbose_name="实际UAT结束时间")
+    test_person = models.CharField(max_length=50, blank=True, null=True, verbose_name="测试人员")
+    task_status = models.CharField(max_length=50, blank=True, null=True, verbose_name="任务状态")
+
+    def __str__(self):
+        return f"{self.source_project}#{self.row_no}"
+
+    class Meta:
+        db_table = "app_web_progress_task"
+        verbose_name = "进度任务"
+        verbose_name_plural = "进度任务"
+        constraints = [
+            models.UniqueConstraint(fields=["source_project", "row_no"], name="uniq_progress_task_row"),
+        ]
+        indexes = [
+            models.Index(fields=["task_status"], name="idx_progress_task_status"),
+            models.Index(fields=["real_exploiter"], name="idx_progress_task_exploiter"),
+            models.Index(fields=["project_module"], name="idx_progress_task_module"),
+            models.Index(fields=["story_code"], name="idx_progress_task_story"),
+        ]
+
+
+class Release(models.Model):
+    """进度表“上线内容”sheet 的一行"""
+    source_project = models.CharField(max_length=100, verbose_name="来源项目")
+    row_no = models.PositiveIntegerField(verbose_name="行号")
+
+    release_month = models.CharField(max_length=20, blank=True, null=True, verbose_name="上线月份")
+    release_date = models.DateTimeField(blank=True, null=True, verbose_name="上线日期")
+    epic_code = models.CharField(max_length=50, blank=True, null=True, verbose_name="Epic")
+    story_code = models.CharField(max_length=50, blank=True, null=True, verbose_name="Story")
+    zentao = models.CharField(max_length=100, blank=True, null=True, verbose_name="禅道")
+    project = models.CharField(max_length=100, blank=True, null=True, verbose_name="所属项目")
+    project_module = models.CharField(max_length=100, blank=True, null=True, verbose_name="所属模块")
+    release_type = models.CharField(max_length=20, blank=True, null=True, verbose_name="上线类型")
+    release_content = models.TextField(blank=True, null=True, verbose_name="上线内容")
+    related_story = models.CharField(max_length=100, blank=True, null=True, verbose_name="关联需求Story编号")
+    owner = models.CharField(max_length=50, blank=True, null=True, verbose_name="责任人")
+
+    def __str__(self):
+        return f"{self.source_project}#{self.row_no}"
+
+    class Meta:
+        db_table = "app_web_release"
+        verbose_name = "上线内容"
+        verbose_name_plural = "上线内容"
+        constraints = [
+            models.UniqueConstraint(fields=["source_project", "row_no"], name="uniq_release_row"),
+        ]
+        indexes = [
+            models.Index(fields=["story_code", "release_type"], name="idx_release_story_type"),
+            models.Index(fields=["release_date"], name="idx_release_date"),
+        ]
+
+
+class ProgressVersion(models.Model):
+    """进度表的一个版本：加载到内容变化的工作簿时记录，只保存相对上一版本变化的行"""
+    # 一个版本只能有一个下一版本，多个进程同时记录同一次变化时只有一个成功
+    parent = models.OneToOneField("self", on_delete=models.PROTECT, blank=True, null=True,
+                                  related_name="child", verbose_name="上一版本")
+    digest = models.CharField(max_length=32, verbose_name="内容摘要")
+    loaded_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name="加载时间")
+    row_count = models.PositiveIntegerField(verbose_name="行数")
+    added_count = models.PositiveIntegerField(default=0, verbose_name="新增行数")
+    removed_count = models.PositiveIntegerField(default=0, verbose_name="删除行数")
+
+    def __str__(self):
+        return f"v{self.pk} {self.loaded_at:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        db_table = "app_web_progress_version"
+        verbose_name = "进度版本"
+        verbose_name_plural = "进度版本"
+
+
+class ProgressVersionRow(models.Model):
+    """版本变化的行：sign 为 1 表示新增、-1 表示删除，修改记为删除旧行并新增新行"""
+    version = models.ForeignKey(ProgressVersion, on_delete=models.CASCADE, related_name="rows",
+                                verbose_name="版本")
+    sign = models.SmallIntegerField(verbose_name="增减")
+    row_hash = models.BigIntegerField(verbose_name="行内容哈希")
+    source_project = models.CharField(max_length=100, blank=True, null=True, verbose_name="来源项目")
+    story_code = models.CharField(max_length=50, blank=True, null=True, verbose_name="Story编号")
+    task_status = models.CharField(max_length=50, blank=True, null=True, verbose_name="任务状态")
+    exploit_progress = models.FloatField(blank=True, null=True, verbose_name="开发已完成进度")
+    data = models.JSONField(verbose_name="行数据")
+
+    class Meta:
+        db_table = "app_web_progress_version_row"
+        verbose_name = "进度版本变化行"
+        verbose_name_plural = "进度版本变化行"
+        indexes = [
+            models.Index(fields=["row_hash"], name="idx_version_row_hash"),
+        ]
+
+
+class Question(models.Model):
+    """题库中的一道题，type_no 为题目在同一题型中的序号（从 1 开始连续编号），用于随机抽题和分页"""
+    TYPE_CHOICES = (
+        ("single", "单选题"),
+        ("multiple", "多选题"),
+        ("judge", "判断题"),
+    )
+    question_type = models.CharField(max_length=20, choices=TYPE_CHOICES, verbose_name="题型")
+    type_no = models.PositiveIntegerField(verbose_name="题型内序号")
+    name = models.TextField(verbose_name="题目")
+    answer = models.CharField(max_length=10, blank=True, default="", verbose_name="答案")
+    options = models.JSONField(default=list, verbose_name="选项")
+    score = models.PositiveSmallIntegerField(default=2, verbose_name="分值")
+
+    def __str__(self):
+        return f"{self.get_question_type_display()}#{self.type_no}"
+
+    class Meta:
+        db_table = "app_web_question"
+        verbose_name = "题目"
+        verbose_name_plural = "题目"
+        constraints = [
+            models.UniqueConstraint(fields=["question_type", "type_no"], name="uniq_question_type_no"),
+        ]
+
+
+class WorkbookUpload(models.Model):
+    """工作簿上传任务：状态保存在数据库中，多进程、多节点部署时任一进程都能查询"""
+    STATUS_CHOICES = (
+        ("pending", "等待解析"),
+        ("parsing", "解析中"),
+        ("done", "完成"),
+        ("failed", "失败"),
+    )
+    id = models.CharField(max_length=32, primary_key=True, verbose_name="任务ID")
+    name = models.CharField(max_length=255, verbose_name="工作簿")
+    size = models.BigIntegerField(verbose_name="文件大小")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending", verbose_name="状态")
+    reason = models.TextField(blank=True, default="", verbose_name="失败原因")
+    rows = models.JSONField(blank=True, null=True, verbose_name="各sheet行数")
+    created_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name="上传时间")
+
+    def __str__(self):
+        return f"{self.name} {self.status}"
+
+    def to_dict(self):
+        job = dict(id=self.id, name=self.name, size=self.size, status=self.status)
+        if self.status == "done":
+            job["rows"] = self.rows
+        elif self.status == "failed":
+            job["reason"] = self.reason
+        return job
+
+    class Meta:
+        db_table = "app_web_workbook_upload"
+        verbose_name = "工作簿上传"
+        verbose_name_plural = "工作簿上传"
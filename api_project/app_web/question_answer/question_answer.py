@@ -4,53 +4,225 @@
 :author: keane
 :file  question_answer.py
 :time  2024/9/19 15:07
-:desc  
+:desc
 """
+import os
+import random
+import threading
+
 import pandas as pd
-def question_answer():
-    df = pd.read_excel(r"E:\keane_python\github\django_project\api_project\app_web\question_answer\桥梁与地下工程复习题.xlsx", sheet_name="单选题")
-    id_num = 0
-    question_list = list()
-    for df_index, df_value in df.iterrows():
-        ismultiple = False
-        name = df_value["题目"]
-        answer = df_value["答案"]
-        score = 2
-        option = [
-            {
-                "id": 1,
-                "name": df_value["A"],
-                "checked": False,
-                "letter": 'A'
-            },
-            {
-                "id": 2,
-                "name": df_value["B"],
-                "checked": False,
-                "letter": 'B'
-            },
-            {
-                "id": 3,
-                "name": df_value["C"],
-                "checked": False,
-                "letter": 'C'
-            },
-            {
-                "id": 4,
-                "name": df_value["D"],
-                "checked": False,
-                "letter": 'D'
-            }
-        ]
-        question_list.append(
-            dict(
-                id=id_num,
-                ismultiple=False,
-                name=name,
-                answer=answer,
-                score=score,
-                option=option
-            )
-        )
-
-    return question_list
\ No newline at end of file
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+
+from app_web.models import Question
+
+QUESTION_BANK_PATH = os.path.join(os.path.dirname(__file__), "桥梁与地下工程复习题.xlsx")
+# 题型 -> (sheet名, 选项列)
+QUESTION_TYPES = {
+    "single": ("单选题", ("A", "B", "C", "D")),
+    "multiple": ("多选题", ("A", "B", "C", "D")),
+    "judge": ("判断题", ("A", "B")),
+}
+QUESTION_SCORE = 2
+IMPORT_BATCH_SIZE = 500
+# 答案中可能出现的选项字母，判分时按位比较
+ANSWER_LETTERS = ("A", "B", "C", "D")
+# 题目主键（BigAutoField）的取值上限
+MAX_QUESTION_ID = 2 ** 63 - 1
+
+# 进程内缓存的题库，key 为文件签名（修改时间、大小）
+_bank_lock = threading.Lock()
+_bank = (None, None)
+
+
+def question_bank_path():
+    """
+    题库路径，默认为本目录下的题库，可通过 settings.QUESTION_BANK_PATH 指定
+    :return:
+    """
+    return getattr(settings, "QUESTION_BANK_PATH", QUESTION_BANK_PATH)
+
+
+def load_question_frames(path=None):
+    """
+    读取各题型 sheet（一次打开工作簿），只解析一次，文件修改后重新读取
+    答案去掉空白并转为大写，没有答案的为空字符串
+    :return: 题型 -> DataFrame（列为 题目、答案 及各选项）
+    """
+    global _bank
+    path = path or question_bank_path()
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    bank_key, frames = _bank
+    if bank_key == key:
+        return frames
+    with _bank_lock:
+        bank_key, frames = _bank
+        if bank_key != key:
+            sheets = pd.read_excel(path, sheet_name=[sheet for sheet, _ in QUESTION_TYPES.values()], dtype=object)
+            frames = dict()
+            for question_type, (sheet, letters) in QUESTION_TYPES.items():
+                df = sheets[sheet][["题目", "答案", *letters]]
+                answer = df["答案"].fillna("").astype(str).str.replace(r"\s", "", regex=True).str.upper()
+                frames[question_type] = df.assign(答案=answer)
+            _bank = (key, frames)
+        return frames
+
+
+def import_questions(frames, batch_size=IMPORT_BATCH_SIZE, model=Question):
+    """
+    题库导入数据库：各题型按 (题型, 序号) 批量插入或更新，删除序号超出题目数的旧题，
+    保证每个题型的 type_no 为 1..N 连续编号
+    :param model: 题目模型，数据迁移中传入迁移状态下的 Question
+    :return: 题型 -> 题目数
+    """
+    result = dict()
+    update_fields = ["name", "answer", "options", "score"]
+    kwargs = dict(update_conflicts=True, update_fields=update_fields)
+    if connection.features.supports_update_conflicts_with_target:
+        kwargs["unique_fields"] = ["question_type", "type_no"]
+    with transaction.atomic():
+        for question_type, (_, letters) in QUESTION_TYPES.items():
+            df = frames[question_type]
+            options = zip(*(df[letter].to_numpy() for letter in letters))
+            objects = [
+                model(question_type=question_type, type_no=type_no, name=name, answer=answer,
+                         options=[None if pd.isna(option) else str(option) for option in row_options],
+                         score=QUESTION_SCORE)
+                for type_no, (name, answer, row_options)
+                in enumerate(zip(df["题目"].to_numpy(), df["答案"].to_numpy(), options), start=1)
+            ]
+            model.objects.bulk_create(objects, batch_size=batch_size, **kwargs)
+            model.objects.filter(question_type=question_type, type_no__gt=len(objects)).delete()
+            result[question_type] = len(objects)
+    return result
+
+
+def question_record(question, include_answer=False):
+    """
+    题目转为前端使用的格式
+    :param include_answer: 是否带答案，默认不带，由判分接口判分并返回答案
+    :return:
+    """
+    letters = QUESTION_TYPES[question.question_type][1]
+    option = [{"id": i, "name": name, "checked": False, "letter": letter}
+              for i, (letter, name) in enumerate(zip(letters, question.options), start=1)]
+    record = dict(id=question.pk, type=question.question_type, ismultiple=question.question_type == "multiple",
+                  name=question.name, answer=question.answer, score=question.score, option=option)
+    if not include_answer:
+        del record["answer"]
+    return record
+
+
+def question_count(question_type):
+    """
+    题型的题目数：type_no 连续编号，取最大序号，只需读唯一索引的一端
+    :return:
+    """
+    return Question.objects.filter(question_type=question_type).aggregate(n=Max("type_no"))["n"] or 0
+
+
+def page_questions(question_type, offset=0, limit=10):
+    """
+    按序号范围分页（type_no 在 (offset, offset + limit] 内），走唯一索引的范围扫描，不使用 OFFSET
+    :return:
+    """
+    queryset = Question.objects.filter(question_type=question_type, type_no__gt=offset,
+                                       type_no__lte=offset + limit).order_by("type_no")
+    return [question_record(question) for question in queryset]
+
+
+def sample_questions(question_type, num):
+    """
+    随机抽题：在 1..N 中均匀抽取 num 个不重复的序号，再按唯一索引取题，
+    耗时只与 num 有关，与题库大小无关（不使用 ORDER BY RAND()）
+    :return:
+    """
+    if num <= 0:
+        return []
+    total = question_count(question_type)
+    type_nos = random.sample(range(1, total + 1), min(num, total))
+    questions = {question.type_no: question
+                 for question in Question.objects.filter(question_type=question_type, type_no__in=type_nos)}
+    return [question_record(questions[type_no]) for type_no in type_nos if type_no in questions]
+
+
+def answer_mask(answers):
+    """
+    答案转为选项位掩码（A=1、B=2、C=4、D=8），与选项顺序、重复、大小写无关，没有作答为 0
+    :return:
+    """
+    answers = answers.fillna("").astype(str).str.upper()
+    mask = pd.Series(0, index=answers.index, dtype="int64")
+    for i, letter in enumerate(ANSWER_LETTERS):
+        mask += answers.str.contains(letter, regex=False).astype("int64") * (1 << i)
+    return mask
+
+
+def parse_question_id(value):
+    """
+    答卷中的题目 id：整数或纯数字字符串，且在主键范围内
+    :return: 整数 id，不合法时为 None
+    """
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        value = int(value)
+    if isinstance(value, int) and not isinstance(value, bool) and 0 < value <= MAX_QUESTION_ID:
+        return value
+    return None
+
+
+def grade_answers(answers):
+    """
+    批量判分：一次查询取出答卷中全部题目的答案和分值，按位掩码整列比较
+    同一题提交多次的以最后一次为准；多选题须完全一致才得分；id 不合法或不存在的题目列入 unknown
+    结果只有是否正确和得分，不返回标准答案（接口无需登录，返回答案等于公开题库答案）
+    :param answers: [{"id": 题目id, "answer": "AB" 或 ["A", "B"]}, ...]
+    :return: (各题结果, 统计)
+    """
+    ids = [parse_question_id(answer.get("id")) for answer in answers]
+    # 不合法的 id 原样放入 unknown
+    invalid = [answer.get("id") for answer, question_id in zip(answers, ids) if question_id is None]
+    sheet = pd.DataFrame({
+        "id": pd.Series([question_id for question_id in ids if question_id is not None], dtype="int64"),
+        "answer": pd.Series([answer.get("answer") for answer, question_id in zip(answers, ids)
+                             if question_id is not None], dtype=object),
+    })
+    sheet["answer"] = sheet["answer"].map(
+        lambda answer: "".join(map(str, answer)) if isinstance(answer, (list, tuple)) else answer)
+    sheet = sheet.drop_duplicates("id", keep="last")
+
+    key = pd.DataFrame.from_records(
+        list(Question.objects.filter(pk__in=sheet["id"].tolist()).values_list("pk", "question_type", "answer",
+                                                                               "score")),
+        columns=["id", "question_type", "key", "full_score"],
+    )
+    sheet = sheet.merge(key, on="id", how="left")
+    known = sheet["question_type"].notna()
+    submitted = answer_mask(sheet["answer"])
+    answered = submitted > 0
+    correct = known & answered & (submitted == answer_mask(sheet["key"]))
+    sheet["correct"] = correct
+    sheet["score"] = sheet["full_score"].where(correct, 0).fillna(0).astype("int64")
+
+    graded = sheet[known]
+    results = [
+        dict(id=question_id, correct=bool(is_correct), score=score)
+        for question_id, is_correct, score in zip(graded["id"].tolist(), graded["correct"].tolist(),
+                                                  graded["score"].tolist())
+    ]
+    by_type = graded.groupby("question_type").agg(
+        count=("id", "size"), correct=("correct", "sum"), score=("score", "sum"), total=("full_score", "sum"))
+    stats = dict(
+        count=len(graded),
+        correct=int(correct.sum()),
+        wrong=int((known & answered & ~correct).sum()),
+        unanswered=int((known & ~answered).sum()),
+        unknown=invalid + sheet.loc[~known, "id"].tolist(),
+        score=int(graded["score"].sum()),
+        total=int(graded["full_score"].sum()),
+        accuracy=round(float(correct.sum()) / len(graded), 4) if len(graded) else None,
+        types={question_type: {name: int(value) for name, value in row.items()}
+               for question_type, row in by_type.iterrows()},
+    )
+    return results, stats
@@ -1,3 +1,454 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from app_web.models import ProgressVersion, Question, WorkbookUpload
+from app_web.question_answer.question_answer import QUESTION_BANK_PATH, load_question_frames, question_count
+from app_web.yuxin_tiecheng import columnar_cache
+from app_web.yuxin_tiecheng.data_orm import OrmDataWeb, import_frames
+from app_web.yuxin_tiecheng.data_web import (
+    FLAW_SHEET, PROGRESS_SHEET, WORKBOOK_PATH, DataWeb, load_projects_frames, resolve_workbooks,
+)
+from app_web.yuxin_tiecheng.versions import progress_trend, record_version
+
+
+class QuestionTestCase(TestCase):
+    """题库测试数据：单选 3 题、多选 2 题，各 2 分"""
+
+    def setUp(self):
+        # 替换数据迁移导入的自带题库
+        Question.objects.all().delete()
+        Question.objects.bulk_create([
+            Question(question_type="single", type_no=no, name=f"单选{no}", answer=answer, options=["a", "b", "c", "d"],
+                     score=2)
+            for no, answer in enumerate(["A", "B", "C"], start=1)
+        ] + [
+            Question(question_type="multiple", type_no=no, name=f"多选{no}", answer=answer,
+                     options=["a", "b", "c", "d"], score=2)
+            for no, answer in enumerate(["AB", "ACD"], start=1)
+        ])
+        self.ids = {(question.question_type, question.type_no): question.pk for question in Question.objects.all()}
+
+
+class QuestionListTests(QuestionTestCase):
+
+    def test_list_and_exam_hide_answers(self):
+        data = self.client.get("/api/question/", {"type": "single"}).json()["data"]
+        self.assertEqual([question["name"] for question in data], ["单选1", "单选2", "单选3"])
+        self.assertTrue(all("answer" not in question for question in data))
+        data = self.client.get("/api/question/exam/", {"single": 2, "multiple": 2, "judge": 0}).json()["data"]
+        self.assertEqual((len(data["single"]), len(data["multiple"])), (2, 2))
+        self.assertTrue(all("answer" not in question for questions in data.values() for question in questions))
+
+
+class QuestionBankMigrationTests(TestCase):
+    """数据迁移已导入自带题库，部署后不执行 import_questions 也能出题"""
+
+    def test_bundled_bank_is_imported(self):
+        frames = load_question_frames(QUESTION_BANK_PATH)
+        for question_type, df in frames.items():
+            self.assertEqual(question_count(question_type), len(df), question_type)
+        data = self.client.get("/api/question/", {"type": "single", "limit": 3}).json()["data"]
+        self.assertEqual([question["name"] for question in data], frames["single"]["题目"].head(3).tolist())
+
+
+class QuestionGradeTests(QuestionTestCase):
+
+    def grade(self, answers):
+        response = self.client.post("/api/question/grade/", json.dumps({"answers": answers}),
+                                    content_type="application/json")
+        return response.json()
+
+    def test_grade_sheet(self):
+        single, multiple = self.ids[("single", 1)], self.ids[("multiple", 2)]
+        result = self.grade([
+            {"id": single, "answer": "b"},
+            {"id": single, "answer": "a"},  # 同一题以最后一次为准
+            {"id": multiple, "answer": ["D", "A", "C"]},  # 与顺序、大小写无关
+            {"id": str(self.ids[("multiple", 1)]), "answer": "A"},  # 多选不全不得分
+            {"id": self.ids[("single", 2)], "answer": ""},
+        ])
+        self.assertEqual(result["code"], 1)
+        self.assertEqual([(item["correct"], item["score"]) for item in result["data"]],
+                         [(True, 2), (True, 2), (False, 0), (False, 0)])
+        stats = result["stats"]
+        self.assertEqual((stats["correct"], stats["wrong"], stats["unanswered"], stats["unknown"]), (2, 1, 1, []))
+        self.assertEqual((stats["score"], stats["total"], stats["accuracy"]), (4, 8, 0.5))
+        self.assertEqual(stats["types"]["multiple"], {"count": 2, "correct": 1, "score": 2, "total": 4})
+
+    def test_invalid_ids_are_unknown(self):
+        single = self.ids[("single", 1)]
+        result = self.grade([
+            {"id": single + 0.7, "answer": "A"},
+            {"id": 10 ** 30, "answer": "A"},
+            {"id": "abc", "answer": "A"},
+            {"id": True, "answer": "A"},
+            {"id": 999999, "answer": "A"},
+            {"id": single, "answer": "A"},
+        ])
+        self.assertEqual([item["id"] for item in result["data"]], [single])
+        self.assertEqual(result["stats"]["unknown"], [single + 0.7, 10 ** 30, "abc", True, 999999])
+
+    def test_results_do_not_expose_answers(self):
+        # 全部留空提交也拿不到标准答案
+        result = self.grade([{"id": question_id, "answer": ""} for question_id in self.ids.values()])
+        self.assertEqual(len(result["data"]), len(self.ids))
+        for item in result["data"]:
+            self.assertEqual(set(item), {"id", "correct", "score"})
+
+    def test_bad_request(self):
+        self.assertEqual(self.grade("x")["code"], 0)
+        self.assertEqual(self.client.get("/api/question/grade/").status_code, 405)
+
+
+class ColumnarCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.workbook = os.path.join(directory.name, "wb.xlsx")
+        with open(self.workbook, "wb") as f:
+            f.write(b"xlsx")
+        self.signature = columnar_cache.source_signature(self.workbook)
+
+    def round_trip(self, df):
+        columnar_cache.write_sheet_cache(self.workbook, "sheet", df, self.signature)
+        return columnar_cache.read_sheet_cache(self.workbook, "sheet", self.signature)
+
+    def test_mixed_columns_keep_types(self):
+        df = pd.DataFrame({
+            "storyId": [2186, "PM-1353", np.nan],
+            "progress": [1, 0.5, np.nan],
+            "month": [3, np.nan, 12],
+            "date": [datetime.datetime(2024, 1, 1), "待定", None],
+            "name": ["a", None, "c"],
+        }, dtype=object)
+        cached = self.round_trip(df)
+        self.assertEqual(list(cached.columns), list(df.columns))
+        for column in df.columns:
+            self.assertTrue(columnar_cache.same_values(df[column].tolist(), cached[column].tolist()), column)
+        self.assertEqual(cached["storyId"].tolist()[:2], [2186, "PM-1353"])
+        self.assertIs(type(cached["month"][0]), int)
+
+    def test_unsupported_values_are_not_cached(self):
+        self.assertIsNone(self.round_trip(pd.DataFrame({"x": [object(), 1]}, dtype=object)))
+        self.assertFalse(os.path.exists(columnar_cache.cache_path(self.workbook, "sheet")))
+
+
+class UploadJobTests(TestCase):
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(username="uploader", password="abc12345")
+        self.headers = dict(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+
+    def test_status_is_read_from_database(self):
+        # 其他进程创建、更新的任务同样能查到
+        WorkbookUpload.objects.create(id="a" * 32, name="A.xlsx", size=10, status="done", rows={"新版": 3})
+        result = self.client.get(f"/api/yuxin/upload/{'a' * 32}/", **self.headers).json()
+        self.assertEqual(result["data"], {"id": "a" * 32, "name": "A.xlsx", "size": 10, "status": "done",
+                                          "rows": {"新版": 3}})
+        self.assertEqual(self.client.get("/api/yuxin/upload/missing/", **self.headers).status_code, 404)
+
+    @override_settings(YUXIN_UPLOAD_MAX_SIZE=1024)
+    def test_oversized_upload_rejected_before_reading_body(self):
+        upload = SimpleUploadedFile("TM整体进度表.xlsx", b"x" * 2048)
+        with mock.patch("django.core.files.uploadhandler.TemporaryFileUploadHandler.new_file") as new_file:
+            response = self.client.post("/api/yuxin/upload/", dict(file=upload), **self.headers)
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()["code"], 0)
+        new_file.assert_not_called()
+        self.assertFalse(WorkbookUpload.objects.exists())
+
+
+class OrmBackendTests(TestCase):
+    """数据库后端与 pandas 后端对同一工作簿的输出相同"""
+
+    @classmethod
+    def setUpTestData(cls):
+        frames = load_projects_frames()
+        # 两行单独作为一个 story，按双精度平均为 71.16（按 float32 计算为 71.15）
+        frames[PROGRESS_SHEET].loc[[0, 1], ["storyCode", "exploitProgress"]] = [["PM-9999", 0.7611], ["PM-9999", 0.662]]
+        import_frames(frames)
+        cls.frames = frames
+        cls.data_web = DataWeb(typed=True, frames=frames)
+
+    def test_search_scores_match(self):
+        orm = OrmDataWeb()
+        for query in ["管理", "PM", "销售 系统", "不存在的词"]:
+            self.assertEqual(orm.search_stories(query, 1, 500), self.data_web.search_stories(query, 1, 500), query)
+
+    def test_schedule_story_double_precision(self):
+        data, _ = OrmDataWeb().schedule_story()
+        self.assertEqual([item["进度"] for item in data if item["name"] == "PM-9999"], [71.16])
+
+    def test_schedule_rounding_matches(self):
+        # 线上快照为紧凑类型，与逐行 object 读取的结果相同
+        self.assertEqual(self.data_web.schedule_story(), OrmDataWeb().schedule_story())
+        self.assertEqual(self.data_web.schedule_story(), DataWeb(frames=self.frames).schedule_story())
+
+
+class RefreshTests(SimpleTestCase):
+    """增量刷新得到的统计与对新数据全量计算的结果相同"""
+
+    @staticmethod
+    def outputs(data_web):
+        return dict(dashboard=data_web.dashboard(), pivot=data_web.pivot("person", "status"),
+                    stories=data_web.pivot("story", "source"))
+
+    def test_refresh_equals_full_rebuild(self):
+        frames = load_projects_frames()
+        previous = DataWeb(typed=True, frames=frames)
+        # 先算好各项统计，刷新时才会走增量更新
+        self.outputs(previous)
+        df = frames[PROGRESS_SHEET].copy()
+        df.loc[5, "taskStatus"] = "已上线"
+        df.loc[7, "exploitProgress"] = 0.3
+        df.loc[20, "realExploiter"] = "新人"
+        df.loc[30, "storyCode"] = 9999
+        df.loc[40, "realSubmitTestDate"] = pd.Timestamp("2023-12-01")
+        df = pd.concat([df.drop(index=[50, 51]), df.iloc[[60]]]).sample(frac=1, random_state=1)
+        frames = dict(frames, **{PROGRESS_SHEET: df})
+
+        refreshed = previous.refresh(frames)
+        self.assertTrue({"count_cube", "story_timing", "story_progress"} <= set(refreshed.__dict__))
+        self.assertEqual(self.outputs(refreshed), self.outputs(DataWeb(typed=True, frames=frames)))
+
+
+class PivotCacheTests(SimpleTestCase):
+    """透视汇总按 (维度, 过滤条件) 缓存在快照上"""
+
+    def test_repeated_pivot_reuses_result(self):
+        data_web = DataWeb(typed=True, frames=load_projects_frames())
+        statuses = sorted(str(value) for value in data_web.excel_df["taskStatus"].dropna().unique())
+        counts = data_web.pivot_counts("person", "status", filters=dict(status=statuses))
+        # 取值顺序不同视为同一过滤条件
+        self.assertIs(data_web.pivot_counts("person", "status", filters=dict(status=statuses[::-1])), counts)
+        self.assertIsNot(data_web.pivot_counts("person", "status"), counts)
+        expected = data_web.excel_df.groupby(["realExploiter", "taskStatus"], observed=True).size()
+        pd.testing.assert_series_equal(counts, expected, check_names=False)
+
+    @mock.patch("app_web.yuxin_tiecheng.data_web.PIVOT_CACHE_SIZE", 2)
+    def test_cache_is_bounded(self):
+        data_web = DataWeb(typed=True, frames=load_projects_frames())
+        for dimension in ("person", "module", "status"):
+            data_web.pivot_counts(dimension)
+        self.assertEqual(len(data_web._pivot_cache), 2)
+
+
+class StoryTimingTests(SimpleTestCase):
+
+    def test_phase_without_dates_is_null(self):
+        frames = load_projects_frames()
+        frames[PROGRESS_SHEET]["startDateUat"] = None
+        data, keys = DataWeb(typed=True, frames=frames).date_use_story()
+        self.assertIn("UAT耗时", keys)
+        self.assertTrue(data)
+        for item in data:
+            self.assertIsNone(item["UAT耗时"], item["name"])
+            self.assertEqual(item["stats"]["UAT耗时"], {"min": None, "median": None, "p90": None})
+        self.assertTrue(any(item["开发耗时"] is not None for item in data))
+
+
+class ProgressVersionTests(TestCase):
+    """版本只保存变化的行，趋势由各版本的变化累加得到"""
+
+    def setUp(self):
+        self.v1 = load_projects_frames()[PROGRESS_SHEET]
+        v2 = self.v1.copy()
+        v2.loc[0, "taskStatus"] = "未上线"
+        v2.loc[1, "exploitProgress"] = 0.5
+        # 删除一行，并重复一行（内容相同的行按个数计）
+        self.v2 = pd.concat([v2.drop(index=[2]), v2.iloc[[3]]], ignore_index=True)
+
+    def record(self, df, loaded_at):
+        version = record_version(df)
+        if version is not None:
+            # loaded_at 为字段默认值，测试中直接改写
+            ProgressVersion.objects.filter(pk=version.pk).update(loaded_at=loaded_at)
+        return version
+
+    @staticmethod
+    def at(day, hour=10):
+        return timezone.make_aware(datetime.datetime(2026, 10, day, hour))
+
+    @staticmethod
+    def expected(df, day):
+        progress = pd.to_numeric(df["exploitProgress"], errors="coerce").fillna(0)
+        done = int((df["taskStatus"] == "已上线").sum())
+        return {"date": day, "已上线": done, "未上线": int((df["taskStatus"] == "未上线").sum()),
+                "总数": len(df), "剩余": len(df) - done, "平均进度": round(float(progress.mean()) * 100, 2)}
+
+    def test_versions_store_only_changed_rows(self):
+        first = self.record(self.v1, self.at(1))
+        self.assertEqual((first.added_count, first.removed_count, first.row_count), (len(self.v1), 0, len(self.v1)))
+        self.assertIsNone(self.record(self.v1, self.at(1, 11)))
+
+        second = self.record(self.v2, self.at(1, 12))
+        self.assertEqual(second.parent_id, first.pk)
+        # 修改的两行记为删除旧行、新增新行，另外删除一行、新增一行重复行
+        self.assertEqual((second.added_count, second.removed_count), (3, 3))
+
+        # 改回第一版的内容：与最新版本不同，记录为新版本
+        third = self.record(self.v1, self.at(3))
+        self.assertEqual((third.parent_id, third.digest), (second.pk, first.digest))
+        self.assertEqual((third.added_count, third.removed_count), (3, 3))
+
+    def test_concurrent_version_is_skipped(self):
+        first = self.record(self.v1, self.at(1))
+        self.record(self.v2, self.at(1, 12))
+        # 另一进程在读到第一版后也记录新版本：第一版已有下一版本，唯一约束冲突，不记录
+        with mock.patch("app_web.yuxin_tiecheng.versions.ProgressVersion.objects.order_by",
+                        return_value=ProgressVersion.objects.filter(pk=first.pk)):
+            self.assertIsNone(record_version(self.v1.iloc[5:]))
+        self.assertEqual(ProgressVersion.objects.count(), 2)
+
+    def test_trend_is_forward_filled_per_day(self):
+        self.record(self.v1, self.at(1))
+        self.record(self.v2, self.at(1, 12))
+        self.record(self.v1, self.at(3))
+        data, keys = progress_trend("2026-09-30", "2026-10-04")
+        self.assertEqual(keys, ["date", "已上线", "未上线", "总数", "剩余", "平均进度"])
+        # 第一个版本之前的日期不返回；同一天取最后一个版本，没有新版本的日期沿用之前的版本
+        self.assertEqual(data, [
+            self.expected(self.v2, "2026-10-01"),
+            self.expected(self.v2, "2026-10-02"),
+            self.expected(self.v1, "2026-10-03"),
+            self.expected(self.v1, "2026-10-04"),
+        ])
+        self.assertEqual(progress_trend("2026-10-02", "2026-10-02")[0], [self.expected(self.v2, "2026-10-02")])
+        self.assertEqual(progress_trend("2026-09-01", "2026-09-30")[0], [])
+        with self.assertRaises(ValueError):
+            progress_trend("2026-10-05", "2026-10-01")
+
+
+class WindowTests(TestCase):
+    """时间窗口：在预排序的日期索引上二分查找"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        frames = load_projects_frames()
+        progress, flaw = frames[PROGRESS_SHEET], frames[FLAW_SHEET]
+        progress["planStartDate"] = None
+        progress.loc[[0, 1, 2, 3, 4], "planStartDate"] = [pd.Timestamp(day) for day in [
+            "2026-10-01", "2026-10-01 23:59", "2026-10-02", "2026-10-02 12:00", "2026-09-30 23:00"]]
+        flaw["releaseDate"] = None
+        flaw.loc[[0, 1, 2], "releaseDate"] = [pd.Timestamp(day) for day in [
+            "2026-10-01 08:00", "2026-10-03", "2026-09-01"]]
+        cls.data_web = DataWeb(typed=True, frames=frames)
+
+    def rows(self, start, end):
+        window = self.data_web.window(start, end)
+        return window.excel_df.index.tolist(), window.flaw_df.index.tolist()
+
+    def test_date_only_end_includes_whole_day(self):
+        self.assertEqual(self.rows(None, "2026-10-01"), ([0, 1, 4], [0, 2]))
+        self.assertEqual(self.rows("2026-10-01", "2026-10-01"), ([0, 1], [0]))
+
+    def test_end_with_time_is_inclusive(self):
+        self.assertEqual(self.rows("2026-10-01", "2026-10-02 12:00")[0], [0, 1, 2, 3])
+        self.assertEqual(self.rows("2026-10-01", "2026-10-02 11:59")[0], [0, 1, 2])
+        self.assertEqual(self.rows("2026-10-02", None), ([2, 3], [1]))
+
+    def test_window_statistics(self):
+        window = self.data_web.window("2026-10-01", "2026-10-02")
+        self.assertEqual(sum(item["value"] for item in window.count_task_status()), 4)
+        self.assertEqual(window.flaw_df["releaseDate"].tolist(), [pd.Timestamp("2026-10-01 08:00")])
+
+    def test_invalid_parameters(self):
+        with self.assertRaises(ValueError):
+            self.data_web.window("2026-10-01", None, "storyCode")
+        for params in [{"start": "2026-10-01", "date_field": "storyCode"}, {"start": "not-a-date"},
+                       {"end": "2026-13-45"}]:
+            result = self.client.get("/api/yuxin/status/count/", params).json()
+            self.assertEqual(result["code"], 0, params)
+        self.assertEqual(self.client.get("/api/yuxin/status/count/", {"start": "2024-01-01"}).json()["code"], 1)
+
+
+class MultiWorkbookTests(SimpleTestCase):
+    """多个项目工作簿（目录或列表）合并读取，每行标记来源项目"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        cls.directory = directory.name
+        for name in ["A.xlsx", "B.xlsx", "~$A.xlsx"]:
+            shutil.copyfile(WORKBOOK_PATH, os.path.join(cls.directory, name))
+        with open(os.path.join(cls.directory, "notes.txt"), "w") as f:
+            f.write("not a workbook")
+        cls.single = load_projects_frames(WORKBOOK_PATH)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_resolve_directory_and_list(self):
+        self.assertEqual(resolve_workbooks(self.directory), [self.path("A.xlsx"), self.path("B.xlsx")])
+        self.assertEqual(resolve_workbooks([self.path("B.xlsx"), self.directory]),
+                         [self.path("B.xlsx"), self.path("A.xlsx"), self.path("B.xlsx")])
+
+    def test_rows_are_tagged_with_source_project(self):
+        # 两个工作簿都没有列式缓存，在进程池中并行解析
+        frames = load_projects_frames(self.directory)
+        for sheet_name in (PROGRESS_SHEET, FLAW_SHEET):
+            df, single = frames[sheet_name], self.single[sheet_name]
+            self.assertEqual(df["sourceProject"].tolist(), ["A"] * len(single) + ["B"] * len(single))
+            single = single.drop(columns="sourceProject").astype(object)
+            for project in ("A", "B"):
+                part = df[df["sourceProject"] == project].drop(columns="sourceProject").reset_index(drop=True)
+                # 列式缓存读出的空值为 None/NaT，解析 XLSX 得到的为 NaN，只比较非空值
+                pd.testing.assert_frame_equal(part.astype(object).where(part.notna(), None),
+                                              single.where(single.notna(), None))
+
+        frames = load_projects_frames([self.path("B.xlsx"), self.path("A.xlsx")])
+        self.assertEqual(frames[PROGRESS_SHEET]["sourceProject"].iloc[[0, -1]].tolist(), ["B", "A"])
+        data_web = DataWeb(typed=True, workbooks=self.directory)
+        self.assertEqual(sum(item["value"] for item in data_web.count_task_status()), 2 * len(self.single[PROGRESS_SHEET]))
+
+    def test_no_workbooks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(ValueError):
+                load_projects_frames(directory)
+
+
+class ScheduleDeviationTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        frames = load_projects_frames()
+        progress = frames[PROGRESS_SHEET]
+        rows = [0, 1, 2, 3, 4]
+        # 完成偏差分别为 -2、0、1、3 天，最后一行没有实际完成日期不计入
+        progress.loc[rows, "realExploiter"] = "测试甲"
+        progress.loc[rows, "projectModule"] = "测试模块"
+        progress.loc[rows, "planEndDate"] = pd.Timestamp("2026-10-10")
+        progress.loc[rows, "realEndDate"] = [pd.Timestamp(day) for day in [
+            "2026-10-08", "2026-10-10", "2026-10-11", "2026-10-13"]] + [None]
+        cls.data_web = DataWeb(typed=True, frames=frames)
+
+    def test_mean_quantiles_and_on_time_ratio(self):
+        for dimension, name in [("person", "测试甲"), ("module", "测试模块")]:
+            data, keys = self.data_web.schedule_deviation(dimension)
+            self.assertEqual(keys, ["name", "完成偏差", "提测偏差", "上线偏差"])
+            item = next(item for item in data if item["name"] == name)
+            self.assertEqual(item["完成偏差"], 0.5)
+            self.assertEqual(item["stats"]["完成偏差"],
+                             {"mean": 0.5, "p50": 0.5, "p90": 2.4, "onTimeRatio": 0.5, "count": 4})
+
+    def test_invalid_dimension(self):
+        with self.assertRaises(ValueError):
+            self.data_web.schedule_deviation("story")
+        self.assertEqual(self.client.get("/api/yuxin/deviation/", {"by": "story"}).json()["code"], 0)
@@ -31,7 +31,17 @@ urlpatterns = [
     path("yuxin/date/use/story/", web_view.yu_xin_date_use_story),
     path("yuxin/schedule/story/", web_view.yu_xin_schedule_story),
     path("yuxin/flaw/story/count/", web_view.yu_xin_flaw_story_count),
+    path("yuxin/dashboard/", web_view.yu_xin_dashboard),
+    path("yuxin/memory/", web_view.yu_xin_memory_usage),
+    path("yuxin/pivot/", web_view.yu_xin_pivot),
+    path("yuxin/trend/", web_view.yu_xin_trend),
+    path("yuxin/deviation/", web_view.yu_xin_deviation),
+    path("yuxin/stories/search/", web_view.yu_xin_story_search),
+    path("yuxin/upload/", web_view.yu_xin_upload),
+    path("yuxin/upload/<str:job_id>/", web_view.yu_xin_upload_status),
     
     # 问答接口
     path("question/", web_view.question_answer),
+    path("question/exam/", web_view.question_exam),
+    path("question/grade/", web_view.question_grade),
 ]
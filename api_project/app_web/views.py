@@ -1,6 +1,12 @@
 import json
-from app_web.yuxin_tiecheng.data_web import DataWeb
+from functools import wraps
+from app_web.yuxin_tiecheng.data_web import get_data_web, DASHBOARD_SECTIONS, PIVOT_DIMENSIONS
+from app_web.yuxin_tiecheng.workbook_upload import get_upload_job, submit_upload
+from app_auth.views import jwt_required
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
 from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import render, HttpResponse
 from django.http.response import JsonResponse
 
@@ -103,45 +109,218 @@ def wms_list(request):
 #             data = self.data_web.count_task_status()
 #             return JsonResponse(dict(code=1, msg="ok", data=data))
 
+def yuxin_window(view_func):
+    """
+    yuxin 统计接口装饰器：取共享快照，带 start/end 参数时按 date_field 日期列（默认计划开始日期）截取时间窗口，
+    视图第二个参数为截取后的 DataWeb
+    """
+    @wraps(view_func)
+    def wrapped_view(request, *args, **kwargs):
+        data_web = get_data_web()
+        start = request.GET.get("start")
+        end = request.GET.get("end")
+        if start or end:
+            try:
+                data_web = data_web.window(start, end, request.GET.get("date_field", "planStartDate"))
+            except ValueError as e:
+                return JsonResponse(dict(code=0, msg="fail", reason=f"{e}"))
+        return view_func(request, data_web, *args, **kwargs)
+
+    return wrapped_view
+
+
 # 统计已上线任务和未上线任务数量
-def yu_xin_status_count(request):
-    data_web = DataWeb()
+@yuxin_window
+def yu_xin_status_count(request, data_web):
     data = data_web.count_task_status()
     return JsonResponse(dict(code=1, msg="ok", data=data))
 
 
 # 按人统计已上线和未上线数量
-def yu_xin_person_count(request):
-    data_web = DataWeb()
+@yuxin_window
+def yu_xin_person_count(request, data_web):
     data, keys = data_web.count_num_person()
     return JsonResponse(dict(code=1, msg="ok", data=data, keys=keys))
 
 
-def yu_xin_module_count(request):
-    data_web = DataWeb()
+@yuxin_window
+def yu_xin_module_count(request, data_web):
     data, keys = data_web.count_num_module()
     return JsonResponse(dict(code=1, msg="ok", data=data, keys=keys))
 
 
-def yu_xin_date_use_story(request):
-    data_web = DataWeb()
+@yuxin_window
+def yu_xin_date_use_story(request, data_web):
     data, keys = data_web.date_use_story()
     return JsonResponse(dict(code=1, msg="ok", data=data, keys=keys))
 
 
-def yu_xin_schedule_story(request):
-    data_web = DataWeb()
+@yuxin_window
+def yu_xin_schedule_story(request, data_web):
     data, keys = data_web.schedule_story()
     return JsonResponse(dict(code=1, msg="ok", data=data, keys=keys))
 
 
-def yu_xin_flaw_story_count(request):
-    data_web = DataWeb()
+@yuxin_window
+def yu_xin_flaw_story_count(request, data_web):
     data, keys = data_web.flaw_count()
     return JsonResponse(dict(code=1, msg="ok", data=data, keys=keys))
 
 
+# 快照各列内存占用
+def yu_xin_memory_usage(request):
+    data_web = get_data_web()
+    data, total = data_web.memory_usage()
+    return JsonResponse(dict(code=1, msg="ok", data=data, total=total))
+
+
+# 看板数据合并接口，?sections=status,person 只返回指定统计项
+@yuxin_window
+def yu_xin_dashboard(request, data_web):
+    sections = request.GET.get("sections")
+    if sections:
+        sections = [section.strip() for section in sections.split(",") if section.strip()]
+        unknown = [section for section in sections if section not in DASHBOARD_SECTIONS]
+        if unknown:
+            return JsonResponse(dict(code=0, msg="fail", reason=f"未知统计项: {','.join(unknown)}"))
+    else:
+        sections = None
+    data = data_web.dashboard(sections)
+    return JsonResponse(dict(code=1, msg="ok", data=data))
+
+
+# 透视统计，?rows=person&columns=status&module=项目产品,清算
+# rows、columns 取 person/module/status/epic/story/project/source，其余同名参数为筛选条件（逗号分隔）
+@yuxin_window
+def yu_xin_pivot(request, data_web):
+    rows = request.GET.get("rows")
+    columns = request.GET.get("columns") or None
+    if rows not in PIVOT_DIMENSIONS or (columns is not None and columns not in PIVOT_DIMENSIONS):
+        return JsonResponse(dict(code=0, msg="fail", reason=f"维度只能是: {','.join(PIVOT_DIMENSIONS)}"))
+    if rows == columns:
+        return JsonResponse(dict(code=0, msg="fail", reason="rows 与 columns 不能相同"))
+    filters = {dimension: request.GET[dimension].split(",")
+               for dimension in PIVOT_DIMENSIONS if request.GET.get(dimension)}
+    data, keys = data_web.pivot(rows, columns, filters)
+    return JsonResponse(dict(code=1, msg="ok", data=data, keys=keys))
+
+
+# 计划与实际日期偏差，?by=person|module（默认 person）
+@yuxin_window
+def yu_xin_deviation(request, data_web):
+    try:
+        data, keys = data_web.schedule_deviation(request.GET.get("by", "person"))
+    except ValueError as e:
+        return JsonResponse(dict(code=0, msg="fail", reason=f"{e}"))
+    return JsonResponse(dict(code=1, msg="ok", data=data, keys=keys))
+
+
+# 功能点搜索，?q=对账&page=1&page_size=20，多个关键词以空格分隔
+@yuxin_window
+def yu_xin_story_search(request, data_web):
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return JsonResponse(dict(code=0, msg="fail", reason="缺少搜索关键词 q"))
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+        page_size = min(max(int(request.GET.get("page_size", 20)), 1), 100)
+    except ValueError:
+        return JsonResponse(dict(code=0, msg="fail", reason="page、page_size 须为整数"))
+    data, total = data_web.search_stories(query, page, page_size)
+    pagination = dict(page=page, page_size=page_size, total=total, pages=(total + page_size - 1) // page_size)
+    return JsonResponse(dict(code=1, msg="ok", data=data, pagination=pagination))
+
+
+# 按天的任务状态数量、剩余任务数和平均进度，?start=2026-10-01&end=2026-10-18，默认最近 30 天
+def yu_xin_trend(request):
+    from app_web.yuxin_tiecheng.versions import progress_trend
+    try:
+        data, keys = progress_trend(request.GET.get("start"), request.GET.get("end"))
+    except ValueError as e:
+        return JsonResponse(dict(code=0, msg="fail", reason=f"{e}"))
+    return JsonResponse(dict(code=1, msg="ok", data=data, keys=keys))
+
+
+# 上传进度工作簿（multipart，字段名 file），后台解析校验后替换线上工作簿，返回任务状态
+@csrf_exempt
+@jwt_required
+def yu_xin_upload(request):
+    if request.method != "POST":
+        return JsonResponse(dict(code=0, msg="fail", reason="只支持 POST"), status=405)
+    # 读取 request.FILES 时才会接收请求体，超限的请求按 Content-Length 提前拒绝，不落盘
+    max_size = getattr(settings, "YUXIN_UPLOAD_MAX_SIZE", None)
+    try:
+        content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        content_length = 0
+    if max_size and content_length > max_size:
+        return JsonResponse(dict(code=0, msg="fail", reason=f"工作簿不能超过 {max_size} 字节"), status=413)
+    # 上传内容按块写入临时文件，不在内存中缓存
+    request.upload_handlers = [TemporaryFileUploadHandler(request)]
+    uploaded_file = request.FILES.get("file")
+    if uploaded_file is None:
+        return JsonResponse(dict(code=0, msg="fail", reason="缺少上传文件 file"))
+    try:
+        job = submit_upload(uploaded_file)
+    except ValueError as e:
+        return JsonResponse(dict(code=0, msg="fail", reason=f"{e}"))
+    finally:
+        uploaded_file.close()
+    return JsonResponse(dict(code=1, msg="ok", data=job), status=202)
+
+
+# 上传任务状态：pending/parsing/done/failed
+@jwt_required
+def yu_xin_upload_status(request, job_id):
+    job = get_upload_job(job_id)
+    if job is None:
+        return JsonResponse(dict(code=0, msg="fail", reason="上传任务不存在"), status=404)
+    return JsonResponse(dict(code=1, msg="ok", data=job))
+
+
+# 题目列表，?type=single&offset=0&limit=10（也可用 page、page_size），按题型内序号分页
 def question_answer(request):
-    from app_web.question_answer.question_answer import question_answer
-    data = question_answer()
-    return JsonResponse(dict(code=1, msg="ok", data=data[0:10]))
+    from app_web.question_answer.question_answer import QUESTION_TYPES, page_questions
+    question_type = request.GET.get("type", "single")
+    if question_type not in QUESTION_TYPES:
+        return JsonResponse(dict(code=0, msg="fail", reason=f"题型只能是: {','.join(QUESTION_TYPES)}"))
+    try:
+        limit = min(max(int(request.GET.get("limit", request.GET.get("page_size", 10))), 1), 100)
+        if "offset" in request.GET:
+            offset = max(int(request.GET["offset"]), 0)
+        else:
+            offset = (max(int(request.GET.get("page", 1)), 1) - 1) * limit
+    except ValueError:
+        return JsonResponse(dict(code=0, msg="fail", reason="offset、limit 须为整数"))
+    data = page_questions(question_type, offset, limit)
+    return JsonResponse(dict(code=1, msg="ok", data=data))
+
+
+# 随机组卷，?single=10&multiple=5&judge=5 为各题型题目数，未指定的题型各 10 道
+def question_exam(request):
+    from app_web.question_answer.question_answer import QUESTION_TYPES, sample_questions
+    try:
+        nums = {question_type: min(max(int(request.GET.get(question_type, 10)), 0), 100)
+                for question_type in QUESTION_TYPES}
+    except ValueError:
+        return JsonResponse(dict(code=0, msg="fail", reason="题目数须为整数"))
+    data = {question_type: sample_questions(question_type, num) for question_type, num in nums.items()}
+    score = sum(question["score"] for questions in data.values() for question in questions)
+    return JsonResponse(dict(code=1, msg="ok", data=data, score=score))
+
+
+# 批量判分，POST {"answers": [{"id": 1, "answer": "AB"}, ...]}，answer 也可以是 ["A", "B"]
+def question_grade(request):
+    from app_web.question_answer.question_answer import grade_answers
+    if request.method != "POST":
+        return JsonResponse(dict(code=0, msg="fail", reason="只支持 POST"), status=405)
+    try:
+        answers = json.loads(request.body)["answers"]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse(dict(code=0, msg="fail", reason="请求体须为 {\"answers\": [...]}"))
+    if not isinstance(answers, list) or not all(isinstance(answer, dict) for answer in answers):
+        return JsonResponse(dict(code=0, msg="fail", reason="answers 须为 [{\"id\": 题目id, \"answer\": 答案}] 列表"))
+    if len(answers) > 1000:
+        return JsonResponse(dict(code=0, msg="fail", reason="每次最多提交 1000 道题"))
+    data, stats = grade_answers(answers)
+    return JsonResponse(dict(code=1, msg="ok", data=data, stats=stats))
@@ -0,0 +1,225 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""
+:author: keane
+:file  columnar_cache.py
+:time  2026/10/18 10:12
+:desc  工作簿 sheet 的列式（Feather）缓存，缓存与工作簿放在同一目录
+"""
+import datetime
+import json
+import numbers
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # 未安装 pyarrow 时始终读取 XLSX
+    pa = None
+    feather = None
+
+# schema 元数据中记录源工作簿签名，用于判断缓存是否过期
+SOURCE_KEY = b"source_signature"
+
+
+def cache_path(workbook, sheet_name):
+    """
+    缓存文件路径：<工作簿名>.<sheet名>.feather
+    :return:
+    """
+    return f"{os.path.splitext(workbook)[0]}.{sheet_name}.feather"
+
+
+def source_signature(workbook):
+    """
+    源工作簿的修改时间和大小
+    :return:
+    """
+    stat = os.stat(workbook)
+    return json.dumps([stat.st_mtime_ns, stat.st_size]).encode()
+
+
+def is_missing(value):
+    """空值（None、NaN、NaT）"""
+    return pd.api.types.is_scalar(value) and pd.isna(value)
+
+
+def value_kind(value):
+    """
+    值的类型，不区分 numpy 与 Python 的同类类型，pd.Timestamp 视同 datetime
+    :return:
+    """
+    if isinstance(value, (bool, np.bool_)):
+        return bool
+    if isinstance(value, numbers.Integral):
+        return int
+    if isinstance(value, numbers.Real):
+        return float
+    if isinstance(value, datetime.datetime):
+        return datetime.datetime
+    return type(value)
+
+
+def same_values(values, restored):
+    """
+    读回的值与原值是否一致：空值只要求都为空，其余要求类型与值都相同（2186 与 '2186' 不同）
+    :return:
+    """
+    for value, restored_value in zip(values, restored):
+        if is_missing(value) or is_missing(restored_value):
+            if not (is_missing(value) and is_missing(restored_value)):
+                return False
+        elif value_kind(value) is not value_kind(restored_value) or value != restored_value:
+            return False
+    return True
+
+
+def to_union_array(values):
+    """
+    类型混杂的列保存为 dense union：每种类型一个子数组，每个值带类型标记，读回后类型不变
+    :return: 无法无损保存时返回 None
+    """
+    kinds = list()
+    type_ids = list()
+    offsets = list()
+    children = dict()
+    for value in values:
+        kind = None if is_missing(value) else value_kind(value)
+        if kind not in children:
+            children[kind] = list()
+            kinds.append(kind)
+        type_ids.append(kinds.index(kind))
+        offsets.append(len(children[kind]))
+        children[kind].append(None if kind is None else value)
+    try:
+        array = pa.UnionArray.from_dense(
+            pa.array(type_ids, type=pa.int8()),
+            pa.array(offsets, type=pa.int32()),
+            [pa.array(children[kind]) for kind in kinds],
+        )
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        return None
+    if not same_values(values, array.to_pylist()):
+        return None
+    return array
+
+
+def to_arrow_table(df):
+    """
+    DataFrame 转 Arrow 表：能推断出单一类型且读回后不变的列按该类型保存，
+    其余列（如同时有数字和文本）保存为 dense union
+    :return: 有列无法无损保存时返回 None，此时不缓存该 sheet
+    """
+    arrays = list()
+    for column in df.columns:
+        values = df[column].tolist()
+        try:
+            array = pa.array(df[column], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            array = None
+        if array is None or not same_values(values, array.to_pandas().astype(object)):
+            array = to_union_array(values)
+            if array is None:
+                return None
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, names=[str(column) for column in df.columns])
+
+
+def to_frame(table):
+    """
+    Arrow 表转 DataFrame，列统一为 object；union 列（pandas 没有对应类型）逐个取值
+    :return:
+    """
+    columns = [
+        pd.Series(column.to_pylist(), dtype=object) if pa.types.is_union(column.type)
+        else column.to_pandas().astype(object)
+        for column in table.columns
+    ]
+    df = pd.concat(columns, axis=1, ignore_index=True) if columns else pd.DataFrame(index=range(table.num_rows))
+    df.columns = table.column_names
+    return df
+
+
+def read_sheet_cache(workbook, sheet_name, signature):
+    """
+    以内存映射方式读取缓存，缓存不存在或与 signature 不一致返回 None
+    返回的列统一为 object，与 pd.read_excel(dtype=object) 的结果保持一致
+    :return:
+    """
+    path = cache_path(workbook, sheet_name)
+    if feather is None or not os.path.exists(path):
+        return None
+    try:
+        table = feather.read_table(path, memory_map=True)
+    except (OSError, pa.ArrowInvalid):
+        return None
+    metadata = table.schema.metadata or dict()
+    if metadata.get(SOURCE_KEY) != signature:
+        return None
+    return to_frame(table)
+
+
+def write_sheet_cache(workbook, sheet_name, df, signature):
+    """
+    写入缓存：先写临时文件再替换，其他进程不会读到写了一半的文件
+    不压缩，读取时可直接内存映射
+    :return:
+    """
+    if feather is None:
+        return
+    table = to_arrow_table(df)
+    if table is None:
+        return
+    metadata = dict(table.schema.metadata or dict())
+    metadata[SOURCE_KEY] = signature
+    table = table.replace_schema_metadata(metadata)
+    path = cache_path(workbook, sheet_name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+    except OSError:
+        # 目录不可写时只是不缓存，不影响本次加载
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def cache_fresh(workbook, sheet_names):
+    """
+    各 sheet 的缓存是否都有效（只读取 schema 元数据，不读数据）
+    :return:
+    """
+    if feather is None:
+        return False
+    signature = source_signature(workbook)
+    for sheet_name in sheet_names:
+        try:
+            with pa.memory_map(cache_path(workbook, sheet_name)) as source:
+                metadata = pa.ipc.open_file(source).schema.metadata or dict()
+        except (OSError, pa.ArrowInvalid):
+            return False
+        if metadata.get(SOURCE_KEY) != signature:
+            return False
+    return True
+
+
+def load_sheets(workbook, parsers):
+    """
+    读取多个清洗后的 sheet：缓存有效的直接使用，
+    其余 sheet 在一次打开 XLSX 的过程中全部解析，清洗后写缓存
+    :param parsers: sheet名 -> 清洗函数（参数为原始 DataFrame，返回清洗后的 DataFrame）
+    :return: sheet名 -> DataFrame
+    """
+    # 解析前取签名，解析期间工作簿被修改时缓存会按旧签名失效
+    signature = source_signature(workbook)
+    frames = {sheet_name: read_sheet_cache(workbook, sheet_name, signature) for sheet_name in parsers}
+    missing = [sheet_name for sheet_name, df in frames.items() if df is None]
+    if missing:
+        raw_frames = pd.read_excel(workbook, header=0, dtype=object, sheet_name=missing)
+        for sheet_name in missing:
+            frames[sheet_name] = parsers[sheet_name](raw_frames[sheet_name])
+            write_sheet_cache(workbook, sheet_name, frames[sheet_name], signature)
+    return frames
@@ -0,0 +1,306 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""
+:author: keane
+:file  data_orm.py
+:time  2026/10/18 15:20
+:desc  进度表导入数据库，以及基于 ORM 聚合的 DataWeb 后端
+"""
+import re
+
+import pandas as pd
+from django.db import connection, models, transaction
+from django.db.models import Count, Q
+
+from app_web.models import ProgressTask, Release
+from app_web.yuxin_tiecheng.data_web import (
+    DataWeb, DASHBOARD_SECTIONS, DATE_COLUMNS, DEVIATION_DIMENSIONS, FLAW_SHEET, PIVOT_DIMENSIONS, PROGRESS_SHEET,
+    SCHEDULE_DEVIATION, STORY_SEARCH_COLUMNS, STORY_SEARCH_TEXT_COLUMNS, STORY_TIMING,
+)
+from app_web.yuxin_tiecheng.story_index import NgramIndex, normalize_text, query_grams
+
+IMPORT_BATCH_SIZE = 500
+
+
+def field_name(column):
+    """
+    DataFrame 列名转模型字段名：storyCode -> story_code
+    :return:
+    """
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", column).lower()
+
+
+def code_value(value):
+    """
+    编号在库中按字符串保存，纯数字的还原为数字，与 pandas 后端的输出保持一致
+    :return:
+    """
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return value
+
+
+def char_value(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def frame_to_objects(df, model, source_project):
+    """
+    清洗后的 DataFrame 转为模型实例，行号为 DataFrame 中的位置
+    :return:
+    """
+    fields = {field.name: field for field in model._meta.concrete_fields}
+    columns = dict()
+    for column in df.columns:
+        name = field_name(column)
+        if name not in fields or name == "source_project":
+            continue
+        series = df[column]
+        field = fields[name]
+        if isinstance(field, models.DateTimeField):
+            series = pd.to_datetime(series, errors="coerce").dt.tz_localize("UTC")
+            values = [None if pd.isna(x) else x.to_pydatetime() for x in series]
+        elif isinstance(field, models.FloatField):
+            values = [None if pd.isna(x) else float(x) for x in pd.to_numeric(series, errors="coerce")]
+        else:
+            values = [None if pd.isna(x) else char_value(x) for x in series]
+        columns[name] = values
+    names = list(columns)
+    records = zip(*columns.values()) if names else [() for _ in range(len(df))]
+    return [model(source_project=source_project, row_no=row_no, **dict(zip(names, record)))
+            for row_no, record in enumerate(records)]
+
+
+def bulk_upsert(model, objects, batch_size=IMPORT_BATCH_SIZE):
+    """
+    按 (source_project, row_no) 批量插入或更新
+    MySQL 的 ON DUPLICATE KEY UPDATE 不支持指定冲突列，只在支持的数据库上传 unique_fields
+    """
+    update_fields = [field.name for field in model._meta.concrete_fields
+                     if not field.primary_key and field.name not in ("source_project", "row_no")]
+    kwargs = dict(update_conflicts=True, update_fields=update_fields)
+    if connection.features.supports_update_conflicts_with_target:
+        kwargs["unique_fields"] = ["source_project", "row_no"]
+    model.objects.bulk_create(objects, batch_size=batch_size, **kwargs)
+
+
+def import_frames(frames, batch_size=IMPORT_BATCH_SIZE):
+    """
+    将 load_projects_frames() 的结果导入数据库：按来源项目分批 upsert，并删除工作簿中已不存在的行
+    :return: 模型 -> 导入行数
+    """
+    result = dict()
+    with transaction.atomic():
+        for sheet_name, model in [(PROGRESS_SHEET, ProgressTask), (FLAW_SHEET, Release)]:
+            df = frames[sheet_name]
+            total = 0
+            for source_project, project_df in df.groupby("sourceProject", sort=False):
+                project_df = project_df.drop(columns=["sourceProject"]).reset_index(drop=True)
+                bulk_upsert(model, frame_to_objects(project_df, model, source_project), batch_size)
+                model.objects.filter(source_project=source_project, row_no__gte=len(project_df)).delete()
+                total += len(project_df)
+            result[model.__name__] = total
+    return result
+
+
+class OrmDataWeb:
+    """
+    DataWeb 的数据库后端：统计由数据库 annotate 聚合完成，输出与 DataWeb 相同，
+    各 web 节点不需要在内存中持有工作簿数据
+    """
+
+    def __init__(self, task_filter=None, release_filter=None):
+        self.task_filter = task_filter or Q()
+        self.release_filter = release_filter or Q()
+
+    @property
+    def tasks(self):
+        return ProgressTask.objects.filter(self.task_filter)
+
+    @property
+    def releases(self):
+        return Release.objects.filter(self.release_filter)
+
+    def window(self, start=None, end=None, date_field="planStartDate"):
+        """
+        按日期列截取时间窗口，参数与 DataWeb.window 相同
+        :return:
+        """
+        if date_field not in DATE_COLUMNS:
+            raise ValueError(f"date_field 只能是: {', '.join(DATE_COLUMNS)}")
+        task_filter, release_filter = self.task_filter, self.release_filter
+        for name, value in [("gte", start), ("lt", end)]:
+            if not value:
+                continue
+            value = pd.Timestamp(value)
+            if name == "lt":
+                # 只有日期时包含当天全天
+                if value == value.normalize():
+                    value = value + pd.Timedelta(days=1)
+                else:
+                    name = "lte"
+            value = (value.tz_localize("UTC") if value.tzinfo is None else value).to_pydatetime()
+            task_filter &= Q(**{f"{field_name(date_field)}__{name}": value})
+            release_filter &= Q(**{f"release_date__{name}": value})
+        return OrmDataWeb(task_filter, release_filter)
+
+    def memory_usage(self):
+        """
+        数据在数据库中，不占用进程内存
+        :return:
+        """
+        return [], 0
+
+    def pivot_counts(self, *dimensions, filters=None):
+        """
+        按维度计数，与 DataWeb.pivot_counts 相同，结果按维度取值排序
+        :return: (维度取值元组, 数量) 的字典
+        """
+        queryset = self.tasks
+        for dimension, values in (filters or dict()).items():
+            queryset = queryset.filter(**{f"{field_name(PIVOT_DIMENSIONS[dimension])}__in": values})
+        fields = [field_name(PIVOT_DIMENSIONS[dimension]) for dimension in dimensions]
+        rows = queryset.exclude(
+            Q(*[Q(**{f"{field}__isnull": True}) for field in fields], _connector=Q.OR)
+        ).values(*fields).annotate(value=Count("id"))
+        counts = {tuple(code_value(row[field]) for field in fields): row["value"] for row in rows}
+        return dict(sorted(counts.items(), key=lambda item: [(isinstance(key, str), key) for key in item[0]]))
+
+    def count_task_status(self):
+        counts = self.pivot_counts("status")
+        counts = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        return [dict(value=value, name=key[0]) for key, value in counts]
+
+    def count_num_person(self):
+        return DataWeb.format_status_count(self.pivot_counts("status", "person"))
+
+    def count_num_module(self):
+        return DataWeb.format_status_count(self.pivot_counts("status", "module"))
+
+    def pivot(self, rows, columns=None, filters=None):
+        if columns is None:
+            counts = self.pivot_counts(rows, filters=filters)
+            return [{"name": key[0], "数量": value} for key, value in counts.items()], ["name", "数量"]
+        return DataWeb.format_status_count(self.pivot_counts(columns, rows, filters=filters))
+
+    def date_use_story(self):
+        """
+        耗时的中位数、p90 无法在各数据库上统一用 SQL 计算，
+        只取计算需要的日期列，复用 DataWeb 的向量化计算
+        :return:
+        """
+        columns = ["storyCode"] + sorted({c for _, start, end in STORY_TIMING for c in (start, end)})
+        rows = self.tasks.filter(
+            real_submit_test_date__isnull=False, real_start_date__isnull=False, end_date_sit__isnull=False,
+            story_code__isnull=False,
+        ).values_list(*[field_name(column) for column in columns])
+        df = pd.DataFrame.from_records(list(rows), columns=columns)
+        df["storyCode"] = df["storyCode"].map(code_value)
+        for column in columns[1:]:
+            df[column] = pd.to_datetime(df[column], utc=True).dt.tz_localize(None)
+        timing = DataWeb.compute_story_timing(df)
+        return DataWeb.format_story_timing(timing)
+
+    def schedule_story(self):
+        """
+        取出进度后复用 DataWeb 的计算（双精度），与 pandas 后端的求和顺序、四舍五入方式相同
+        :return:
+        """
+        rows = self.tasks.filter(story_code__isnull=False).order_by("source_project", "row_no").values_list(
+            "story_code", "exploit_progress")
+        df = pd.DataFrame.from_records(list(rows), columns=["storyCode", "exploitProgress"])
+        progress = DataWeb.compute_story_progress(df)
+        rows = sorted(((code_value(key), value) for key, value in progress.items()),
+                      key=lambda item: (isinstance(item[0], str), item[0]))
+        new_data = [{"name": key, "进度": round(value * 100, 2)} for key, value in rows]
+        return new_data, ["name", "进度"]
+
+    def schedule_deviation(self, dimension="person"):
+        """
+        偏差的分位数同样只取需要的列，复用 DataWeb 的向量化计算
+        :return:
+        """
+        if dimension not in DEVIATION_DIMENSIONS:
+            raise ValueError(f"维度只能是: {','.join(DEVIATION_DIMENSIONS)}")
+        column = PIVOT_DIMENSIONS[dimension]
+        columns = [column] + [c for _, plan, real in SCHEDULE_DEVIATION for c in (plan, real)]
+        rows = self.tasks.filter(**{f"{field_name(column)}__isnull": False}).values_list(
+            *[field_name(c) for c in columns])
+        df = pd.DataFrame.from_records(list(rows), columns=columns)
+        for c in columns[1:]:
+            df[c] = pd.to_datetime(df[c], utc=True).dt.tz_localize(None)
+        stats = DataWeb.compute_deviation(df, [dimension])[dimension]
+        stats = stats.sort_index(key=lambda index: index.map(lambda key: (isinstance(key, str), key)))
+        return DataWeb.format_deviation(stats)
+
+    def search_stories(self, query, page=1, page_size=20):
+        """
+        数据库后端没有常驻内存的索引：先用 LIKE 筛出包含全部关键词的行，再对这些行建索引排序
+        idf 用全表的文档频率（一次聚合查询），得分与 pandas 后端对全部行建索引时相同
+        :return: (当前页数据, 命中总数)
+        """
+        query = str(query).replace("|", " ")
+        queryset = self.tasks
+        for term in query.split():
+            queryset = queryset.filter(self.text_contains(term))
+        fields = {column: field_name(column) for column in set(STORY_SEARCH_COLUMNS) | set(STORY_SEARCH_TEXT_COLUMNS)}
+        rows = list(queryset.order_by("source_project", "row_no").values(*fields.values()))
+        texts = ["|".join(row[fields[column]] or "" for column in STORY_SEARCH_TEXT_COLUMNS) for row in rows]
+        doc_count, doc_freqs = self.doc_freqs(query) if rows else (None, None)
+        docs, scores = NgramIndex(texts, doc_count, doc_freqs).search(query)
+        start = (page - 1) * page_size
+        data = list()
+        for doc, score in zip(docs[start:start + page_size], scores[start:start + page_size]):
+            row = rows[doc]
+            record = {column: row[fields[column]] for column in STORY_SEARCH_COLUMNS}
+            record["storyCode"] = code_value(record["storyCode"])
+            record["epicCode"] = code_value(record["epicCode"])
+            data.append(dict(record, score=round(float(score), 4)))
+        return data, len(scores)
+
+    @staticmethod
+    def text_contains(term):
+        """Epic编号、Story编号、功能点描述中任一列包含 term"""
+        return Q(*[Q(**{f"{field_name(column)}__icontains": term}) for column in STORY_SEARCH_TEXT_COLUMNS],
+                 _connector=Q.OR)
+
+    def doc_freqs(self, query):
+        """
+        全表行数及包含查询各 gram 的行数
+        :return: (行数, gram -> 行数)
+        """
+        terms = [normalize_text(term) for term in query.split()]
+        grams = list(dict.fromkeys(gram for term in terms if term for gram in query_grams(term)))
+        counts = self.tasks.aggregate(
+            total=Count("id"),
+            **{f"gram{i}": Count("id", filter=self.text_contains(gram)) for i, gram in enumerate(grams)},
+        )
+        return counts["total"], {gram: counts[f"gram{i}"] for i, gram in enumerate(grams)}
+
+    def flaw_count(self):
+        rows = self.releases.filter(story_code__isnull=False, release_type="修正").values(
+            "story_code").annotate(value=Count("id"))
+        rows = sorted(((code_value(row["story_code"]), row["value"]) for row in rows),
+                      key=lambda item: (isinstance(item[0], str), item[0]))
+        keys = ["name", "数量"]
+        new_data = [{"name": key, "数量": value} for key, value in rows]
+        if not new_data:
+            new_data.append({"name": "空", "数量": 0})
+        return new_data, keys
+
+    def dashboard(self, sections=None):
+        sections = list(DASHBOARD_SECTIONS) if sections is None else sections
+        data = dict()
+        if "status" in sections:
+            data["status"] = self.count_task_status()
+        for section, method in [("person", self.count_num_person),
+                                ("module", self.count_num_module),
+                                ("dateUse", self.date_use_story),
+                                ("schedule", self.schedule_story),
+                                ("flaw", self.flaw_count)]:
+            if section in sections:
+                section_data, keys = method()
+                data[section] = dict(data=section_data, keys=keys)
+        return data
@@ -6,65 +6,385 @@
 :time  2024/1/29 9:39
 :desc  
 """
+import functools
+import logging
+import multiprocessing
 import os.path
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
+from django.conf import settings
+from app_web.yuxin_tiecheng.columnar_cache import cache_fresh, cache_path, load_sheets
+from app_web.yuxin_tiecheng.story_index import NgramIndex
+
+logger = logging.getLogger(__name__)
+
+WORKBOOK_PATH = os.path.join(os.path.dirname(__file__), "TM整体进度表.xlsx")
+PROGRESS_SHEET = "新版"
+FLAW_SHEET = "上线内容"
+
+# “新版”sheet 列映射：英文列名 -> 表头中包含的中文
+COLUMN_MAP = {
+    "project": "所属项目",
+    "epicCode": "Epic编号",
+    "storyCode": "Story编号",
+    "projectModule": "所属模块",
+    "functionDescribe": "功能点描述",
+    "exploitProgress": "开发已完成进度",
+    "planStartDate": "计划开始日期（必填）",
+    "planEndDate": "计划完成日期（必填）",
+    "realStartDate": "实际开始日期",
+    "realEndDate": "实际完成日期",
+    "planSubmitTestDate": "计划提交测试日期（必填）【原则上应比预计上线日期提前15天】",
+    "realSubmitTestDate": "实际提交测试日期（非必填）[完成上线 必填]",
+    "planLineDate": "预计上线日期（必填）",
+    "realLineDate": "实际上线日期（非必填）",
+    "realExploiter": "开发人员",
+    "startDateSit": "实际SIT开始时间",
+    "endDateSit": "实际SIT结束时间",
+    "startDateUat": "实际UAT开始时间",
+    "endDateUat": "实际UAT结束时间",
+    "testPerson": "测试人员",
+    "taskStatus": "任务状态",
+}
+
+# 缺少时无法统计的列
+REQUIRED_COLUMNS = ("storyCode", "projectModule", "exploitProgress", "realExploiter", "taskStatus")
+
+# 表头匹配规则只编译一次；较长的规则更具体，同一表头命中多条规则时取最长的
+# （如“计划提交测试日期……比预计上线日期提前15天”不能被当作 预计上线日期）
+_COLUMN_PATTERNS = sorted(
+    ((e_name, re.compile(re.escape(c_name))) for e_name, c_name in COLUMN_MAP.items()),
+    key=lambda item: len(item[1].pattern),
+    reverse=True,
+)
+
+# 紧凑类型模式：低基数维度列与日期列
+CATEGORY_COLUMNS = ("project", "epicCode", "storyCode", "projectModule", "realExploiter", "testPerson", "taskStatus",
+                    "sourceProject")
+DATE_COLUMNS = (
+    "planStartDate", "planEndDate", "realStartDate", "realEndDate",
+    "planSubmitTestDate", "realSubmitTestDate", "planLineDate", "realLineDate",
+    "startDateSit", "endDateSit", "startDateUat", "endDateUat",
+)
+
+# 上线内容 sheet 的列映射
+FLAW_COLUMN_MAP = {
+    "releaseMonth": "上线月份",
+    "releaseDate": "上线日期",
+    "epicCode": "Epic",
+    "storyCode": "Story",
+    "zentao": "禅道",
+    "project": "所属项目",
+    "projectModule": "所属模块",
+    "releaseType": "上线类型",
+    "releaseContent": "上线内容",
+    "relatedStory": "（BUG）关联需求「Story编号」",
+    "owner": "责任人",
+}
+
+# 进程内共享的 DataWeb 快照，key 为工作簿签名
+_snapshot_lock = threading.Lock()
+_snapshot = (None, None)
+
+# Story 耗时：(名称, 开始日期列, 结束日期列)
+STORY_TIMING = (
+    ("开发耗时", "realStartDate", "realSubmitTestDate"),
+    ("测试耗时", "realSubmitTestDate", "endDateSit"),
+    ("UAT耗时", "startDateUat", "endDateUat"),
+    ("整体耗时", "realStartDate", "endDateSit"),
+)
+
+# 透视接口维度 -> 列名
+PIVOT_DIMENSIONS = {
+    "person": "realExploiter",
+    "module": "projectModule",
+    "status": "taskStatus",
+    "epic": "epicCode",
+    "story": "storyCode",
+    "project": "project",
+    "source": "sourceProject",
+}
+# 每个快照缓存的透视汇总结果个数上限（过滤条件来自请求参数，需要限制）
+PIVOT_CACHE_SIZE = 128
+
+# 计划与实际日期偏差：(名称, 计划日期列, 实际日期列)
+SCHEDULE_DEVIATION = (
+    ("完成偏差", "planEndDate", "realEndDate"),
+    ("提测偏差", "planSubmitTestDate", "realSubmitTestDate"),
+    ("上线偏差", "planLineDate", "realLineDate"),
+)
+
+# 偏差统计支持的维度
+DEVIATION_DIMENSIONS = ("person", "module")
+
+# 功能点搜索：建索引的列、结果中返回的列
+STORY_SEARCH_TEXT_COLUMNS = ("epicCode", "storyCode", "functionDescribe")
+STORY_SEARCH_COLUMNS = ("storyCode", "epicCode", "project", "projectModule", "functionDescribe", "realExploiter",
+                        "taskStatus")
+
+# 看板接口支持的统计项
+DASHBOARD_SECTIONS = ("status", "person", "module", "dateUse", "schedule", "flaw")
+
+
+@functools.lru_cache(maxsize=32)
+def resolve_columns(headers):
+    """
+    按表头解析列映射，结果按表头元组缓存，同样的表头只解析一次
+    每个表头取命中的最具体规则，每个英文列名取第一个命中的表头
+    :param headers: 工作簿表头元组
+    :return: (表头 -> 英文列名 的映射对, 未能解析的英文列名)
+    """
+    resolved = dict()
+    for header in headers:
+        for e_name, pattern in _COLUMN_PATTERNS:
+            if pattern.search(str(header)):
+                resolved.setdefault(e_name, header)
+                break
+    missing = tuple(e_name for e_name in COLUMN_MAP if e_name not in resolved)
+    return tuple((header, e_name) for e_name, header in resolved.items()), missing
+
+
+def load_workbook_frames(workbook=WORKBOOK_PATH):
+    """
+    读取清洗后的“新版”“上线内容”两个 sheet：一次打开工作簿同时解析，
+    两个 sheet 的列式缓存都有效时不打开工作簿
+    :return: sheet名 -> DataFrame
+    """
+    return load_sheets(workbook, {
+        PROGRESS_SHEET: DataWeb.parse_progress_data,
+        FLAW_SHEET: DataWeb.parse_flaw_data,
+    })
+
+
+def load_project_frames(workbook):
+    """
+    读取单个项目工作簿，每行标记来源项目（工作簿文件名）
+    :return: sheet名 -> DataFrame
+    """
+    source_project = os.path.splitext(os.path.basename(workbook))[0]
+    frames = load_workbook_frames(workbook)
+    return {sheet_name: df.assign(sourceProject=source_project) for sheet_name, df in frames.items()}
+
+
+def resolve_workbooks(workbooks=WORKBOOK_PATH):
+    """
+    工作簿来源展开为文件列表：单个文件、目录（目录下全部 .xlsx，忽略 ~$ 临时文件）或二者组成的列表
+    :return:
+    """
+    if isinstance(workbooks, (str, os.PathLike)):
+        workbooks = [workbooks]
+    paths = list()
+    for workbook in workbooks:
+        if os.path.isdir(workbook):
+            paths.extend(sorted(
+                os.path.join(workbook, name) for name in os.listdir(workbook)
+                if name.endswith(".xlsx") and not name.startswith("~$")
+            ))
+        else:
+            paths.append(os.fspath(workbook))
+    return paths
+
+
+def load_projects_frames(workbooks=WORKBOOK_PATH, max_workers=None):
+    """
+    读取多个项目工作簿并按 sheet 合并，需要解析的 XLSX 有多个时在进程池中并行解析
+    进程池使用 spawn 启动，避免在多线程的 web 进程中 fork
+    :param workbooks: resolve_workbooks 支持的工作簿来源
+    :param max_workers: 进程数，默认不超过 CPU 核数
+    :return: sheet名 -> DataFrame
+    """
+    paths = resolve_workbooks(workbooks)
+    if not paths:
+        raise ValueError(f"没有找到工作簿: {workbooks}")
+    # 列式缓存有效的直接在本进程读取，只有需要解析 XLSX 的才进入进程池
+    parse_paths = [path for path in paths if not cache_fresh(path, (PROGRESS_SHEET, FLAW_SHEET))]
+    results = dict()
+    if len(parse_paths) > 1:
+        max_workers = max_workers or min(len(parse_paths), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            results.update(zip(parse_paths, executor.map(load_project_frames, parse_paths)))
+    for path in paths:
+        if path not in results:
+            results[path] = load_project_frames(path)
+    results = [results[path] for path in paths]
+    return {
+        sheet_name: pd.concat([frames[sheet_name] for frames in results], ignore_index=True)
+        for sheet_name in (PROGRESS_SHEET, FLAW_SHEET)
+    }
+
+
+def group_order(series):
+    """
+    groupby(series, observed=True) 得到的分组顺序：category 按类别顺序，其他按取值排序
+    :return:
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = np.unique(series.cat.codes)
+        return series.cat.categories[codes[codes >= 0]]
+    return pd.Index(series.dropna().unique()).sort_values()
+
+
+def workbook_signature(filepath=WORKBOOK_PATH):
+    """
+    工作簿签名（路径、修改时间、文件大小），文件变化后签名随之变化
+    :return:
+    """
+    stat = os.stat(filepath)
+    return os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size
+
+
+def get_data_web():
+    """
+    获取进程内共享的 DataWeb 快照，工作簿来源为 settings.YUXIN_WORKBOOKS
+    settings.YUXIN_BACKEND 为 "orm" 时返回数据库后端 OrmDataWeb（数据由 import_progress 命令导入）
+    工作簿未变化时直接复用，任一工作簿变化（或目录中增删工作簿）后只重新加载一次，
+    YUXIN_INCREMENTAL_REFRESH 开启（默认）时在上一个快照基础上增量刷新统计结果；
+    并发的首次请求在锁上等待同一次加载，不会各自解析工作簿
+    :return:
+    """
+    global _snapshot
+    if getattr(settings, "YUXIN_BACKEND", "pandas") == "orm":
+        from app_web.yuxin_tiecheng.data_orm import OrmDataWeb
+        return OrmDataWeb()
+    paths = resolve_workbooks(getattr(settings, "YUXIN_WORKBOOKS", WORKBOOK_PATH))
+    incremental = getattr(settings, "YUXIN_INCREMENTAL_REFRESH", True)
+    key = tuple(workbook_signature(path) for path in paths)
+    snapshot_key, data_web = _snapshot
+    if snapshot_key == key:
+        return data_web
+    with _snapshot_lock:
+        # 等锁期间可能已被其他线程加载
+        snapshot_key, data_web = _snapshot
+        if snapshot_key != key:
+            if incremental and data_web is not None:
+                data_web = data_web.refresh(load_projects_frames(paths))
+            else:
+                data_web = DataWeb(typed=True, workbooks=paths)
+            _snapshot = (key, data_web)
+            record_snapshot_version(data_web)
+        return data_web
+
+
+def record_snapshot_version(data_web):
+    """
+    记录快照对应的进度表版本（settings.YUXIN_RECORD_VERSIONS，默认开启），供趋势接口使用
+    数据库不可用时只记录日志，不影响统计接口
+    :return:
+    """
+    if not getattr(settings, "YUXIN_RECORD_VERSIONS", True):
+        return
+    from django.db import DatabaseError
+    from app_web.yuxin_tiecheng.versions import record_version
+    try:
+        record_version(data_web.excel_df)
+    except DatabaseError:
+        logger.exception("记录进度版本失败")
+
+
+def install_workbook(staged_path, target_path):
+    """
+    用上传的工作簿替换 target_path 并切换共享快照
+    先在暂存位置解析、校验并构建新快照，全部成功后才替换工作簿；替换文件与切换快照在锁内一起完成，
+    读请求拿到的要么是旧快照、要么是新快照，不会看到加载了一半的数据，也不会在锁上等待解析
+    YUXIN_BACKEND 为 "orm" 时改为在事务中导入数据库
+    :param staged_path: 暂存的工作簿，文件名与 target_path 相同且在同一文件系统上（os.replace 为原子操作）
+    :param target_path: 要替换（或新增）的工作簿
+    :return: 上传工作簿各 sheet 的行数
+    """
+    global _snapshot
+    # 解析失败（文件损坏、缺少必需列）时直接抛出，线上工作簿保持不变
+    staged_frames = load_project_frames(staged_path)
+    result = {sheet_name: len(df) for sheet_name, df in staged_frames.items()}
+    if getattr(settings, "YUXIN_BACKEND", "pandas") == "orm":
+        from app_web.yuxin_tiecheng.data_orm import import_frames
+        import_frames(staged_frames)
+        os.replace(staged_path, target_path)
+        return result
+
+    target_path = os.path.abspath(target_path)
+    paths = [os.path.abspath(path) for path in resolve_workbooks(getattr(settings, "YUXIN_WORKBOOKS", WORKBOOK_PATH))]
+    if target_path not in paths:
+        paths.append(target_path)
+    # 其他工作簿的签名在读取前获取，读取期间被修改时下一次 get_data_web 会按签名重新加载
+    signatures = {path: workbook_signature(path) for path in paths if path != target_path}
+    project_frames = [staged_frames if path == target_path else load_project_frames(path) for path in paths]
+    frames = {
+        sheet_name: pd.concat([frames[sheet_name] for frames in project_frames], ignore_index=True)
+        for sheet_name in (PROGRESS_SHEET, FLAW_SHEET)
+    }
+    _, previous = _snapshot
+    if getattr(settings, "YUXIN_INCREMENTAL_REFRESH", True) and previous is not None:
+        data_web = previous.refresh(frames)
+    else:
+        data_web = DataWeb(typed=True, frames=frames)
+
+    with _snapshot_lock:
+        os.replace(staged_path, target_path)
+        # 暂存文件解析时写的列式缓存一起移动，os.replace 保留修改时间和大小，缓存签名仍然有效
+        for sheet_name in (PROGRESS_SHEET, FLAW_SHEET):
+            if os.path.exists(cache_path(staged_path, sheet_name)):
+                os.replace(cache_path(staged_path, sheet_name), cache_path(target_path, sheet_name))
+        signatures[target_path] = workbook_signature(target_path)
+        # key 按 get_data_web 的顺序排列；期间新增的工作簿不在快照中，签名记为空，下一次请求时重新加载
+        paths = [os.path.abspath(path) for path in resolve_workbooks(getattr(settings, "YUXIN_WORKBOOKS", WORKBOOK_PATH))]
+        _snapshot = (tuple(signatures.get(path, (path, None, None)) for path in paths), data_web)
+    record_snapshot_version(data_web)
+    return result
 
 
 class DataWeb:
-    def __init__(self):
+    def __init__(self, typed=False, frames=None, workbooks=WORKBOOK_PATH):
+        """
+        :param typed: 紧凑类型模式，低基数维度列为 category、日期列为 datetime64、进度为 float64
+        :param frames: load_projects_frames() 的结果，为空时读取 workbooks
+        :param workbooks: 工作簿文件、目录或列表，多个工作簿并行解析后合并，行上标记来源项目 sourceProject
+        """
         self.filepath = os.path.dirname(__file__)
-        self.column_map = {
-            "project": "所属项目",
-            "epicCode": "Epic编号",
-            "storyCode": "Story编号",
-            "projectModule": "所属模块",
-            "functionDescribe": "功能点描述",
-            "exploitProgress": "开发已完成进度",
-            "planStartDate": "计划开始日期（必填）",
-            "planEndDate": "计划完成日期（必填）",
-            "realStartDate": "实际开始日期",
-            "realEndDate": "实际完成日期",
-            "planSubmitTestDate": "计划提交测试日期（必填）【原则上应比预计上线日期提前15天】",
-            "realSubmitTestDate": "实际提交测试日期（非必填）[完成上线 必填]",
-            "planLineDate": "预计上线日期（必填）",
-            "realLineDate": "实际上线日期（非必填）",
-            "realExploiter": "开发人员",
-            "startDateSit": "实际SIT开始时间",
-            "endDateSit": "实际SIT结束时间",
-            "startDateUat": "实际UAT开始时间",
-            "endDateUat": "实际UAT结束时间",
-            "testPerson": "测试人员",
-            "taskStatus": "任务状态",
-        }
-        self.excel_df = self.init_excel_data()
-        self.excel_df.replace({"taskStatus": np.nan}, "未上线", inplace=True)
-        self.excel_df.replace({"realExploiter": np.nan}, "未分配", inplace=True)
-
-    def read_excel(self):
-        filepath = f"{self.filepath}/TM整体进度表.xlsx"
-        df = pd.read_excel(filepath, header=0, dtype=object, sheet_name="新版")
-        return df
+        self.column_map = COLUMN_MAP
+        # 上线内容 sheet 的列映射
+        self.flaw_column_map = FLAW_COLUMN_MAP
+        if frames is None:
+            frames = load_projects_frames(workbooks)
+        excel_df = frames[PROGRESS_SHEET]
+        self.flaw_df = frames[FLAW_SHEET]
+        if typed:
+            excel_df = self.to_typed_frame(excel_df)
+        self.excel_df = excel_df
+        # (维度, 过滤条件) -> 汇总结果，快照只读所以结果一直有效；
+        # dict 的单次读写是原子的，并发时最多重复计算一次，不需要加锁
+        self._pivot_cache = dict()
+        # 加载完成后冻结：统计方法只读 excel_df，派生数据用 cached_property 缓存在快照上，
+        # 同一快照可被多个线程同时使用而无需加锁或拷贝
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError(f"DataWeb 快照只读，不能修改属性: {name}")
+        super().__setattr__(name, value)
 
-    def filter_column_data(self, df):
+    @staticmethod
+    def filter_column_data(df):
         """
         根据column映射筛选出需要的数据
+        缺少必需列时抛出 ValueError，缺少其他列时记录日志并以空列补齐
         :return:
         """
-        columns = df.columns
-        new_column_map = dict()
-        for e_name, c_name in self.column_map.items():
-            for column in columns:
-                if self.column_map["planSubmitTestDate"] in column and self.column_map["planLineDate"] in column:
-                    new_column_map[column] = "planSubmitTestDate"
-                else:
-                    if c_name in column:
-                        new_column_map[column] = e_name
-                        break
-        return new_column_map
+        column_pairs, missing = resolve_columns(tuple(df.columns))
+        missing_required = [e_name for e_name in missing if e_name in REQUIRED_COLUMNS]
+        if missing_required:
+            raise ValueError(f"工作簿缺少必需列: {', '.join(COLUMN_MAP[e_name] for e_name in missing_required)}")
+        if missing:
+            logger.warning("工作簿缺少列: %s", ", ".join(COLUMN_MAP[e_name] for e_name in missing))
+        return dict(column_pairs)
 
-    def init_excel_data(self):
+    @staticmethod
+    def parse_progress_data(df):
         """
+        解析“新版”sheet：列名映射、筛选、空值填充
         按所属项目、Epic编号、Story编号、所属模块进行筛选
         展示：开发进度
         计算：
@@ -78,19 +398,110 @@ class DataWeb:
         """
         # 按照 人、模块统计 工作量、 缺陷、进度及偏差、
         # 		从Story 维度 分析 开发耗时 测试耗时 整体耗时（立项-上线）
-        df = self.read_excel()
-        column_map = self.filter_column_data(df)
+        column_map = DataWeb.filter_column_data(df)
         df = df.rename(columns=column_map)
-        filter_column = list(self.column_map.keys())
-        df = df[filter_column]
+        filter_column = list(COLUMN_MAP.keys())
+        df = df.reindex(columns=filter_column)
+        df = df.replace({"taskStatus": np.nan}, "未上线")
+        df = df.replace({"realExploiter": np.nan}, "未分配")
+        return df
+
+    @staticmethod
+    def parse_flaw_data(df):
+        """
+        解析“上线内容”sheet：按 flaw_column_map 重命名并筛选
+        :return:
+        """
+        df = df.rename(columns={c_name: e_name for e_name, c_name in FLAW_COLUMN_MAP.items()})
+        df = df.reindex(columns=list(FLAW_COLUMN_MAP.keys()))
         return df
 
+    @staticmethod
+    def to_typed_frame(df):
+        """
+        转为紧凑类型：维度列 category（groupby 基于整数编码）、日期列 datetime64、进度 float64
+        进度不用 float32：0.7611 存为 float32 后是 0.76109999，平均值保留两位小数时与原值不同
+        无法解析的日期、进度按空值处理
+        :return:
+        """
+        columns = dict()
+        for column in CATEGORY_COLUMNS:
+            columns[column] = df[column].astype("category")
+        for column in DATE_COLUMNS:
+            columns[column] = pd.to_datetime(df[column], errors="coerce")
+        columns["exploitProgress"] = pd.to_numeric(df["exploitProgress"], errors="coerce").astype("float64")
+        return df.assign(**columns)
+
+    @functools.cached_property
+    def date_indexes(self):
+        """
+        日期列预排序索引：列名 -> (升序的有效日期, 对应行位置)，空日期不进入索引
+        包含“新版”的全部日期列，以及上线内容的上线日期 releaseDate
+        :return:
+        """
+        columns = [(column, self.excel_df[column]) for column in DATE_COLUMNS]
+        columns.append(("releaseDate", self.flaw_df["releaseDate"]))
+        indexes = dict()
+        for column, series in columns:
+            dates = pd.to_datetime(series, errors="coerce").to_numpy(dtype="datetime64[ns]")
+            valid = np.flatnonzero(~np.isnat(dates))
+            order = np.argsort(dates[valid], kind="stable")
+            indexes[column] = (dates[valid][order], valid[order])
+        return indexes
+
+    def window_rows(self, column, start=None, end=None):
+        """
+        在预排序索引上二分查找窗口内的行位置，按原行顺序返回
+        :param start: 开始时间（含）
+        :param end: 结束时间（含），只有日期时包含当天全天
+        :return:
+        """
+        dates, positions = self.date_indexes[column]
+        low, high = 0, len(dates)
+        if start is not None:
+            low = dates.searchsorted(start.to_datetime64(), side="left")
+        if end is not None:
+            if end == end.normalize():
+                high = dates.searchsorted((end + pd.Timedelta(days=1)).to_datetime64(), side="left")
+            else:
+                high = dates.searchsorted(end.to_datetime64(), side="right")
+        return np.sort(positions[low:high])
+
+    def window(self, start=None, end=None, date_field="planStartDate"):
+        """
+        按日期列截取时间窗口，返回只含窗口内数据的新快照，耗时 O(log n + k)
+        上线内容按上线日期截取
+        :param start: 开始日期（含），字符串或 Timestamp
+        :param end: 结束日期（含）
+        :param date_field: 截取依据的日期列，取 DATE_COLUMNS 之一
+        :return:
+        """
+        if date_field not in DATE_COLUMNS:
+            raise ValueError(f"date_field 只能是: {', '.join(DATE_COLUMNS)}")
+        start = pd.Timestamp(start) if start else None
+        end = pd.Timestamp(end) if end else None
+        return DataWeb(frames={
+            PROGRESS_SHEET: self.excel_df.iloc[self.window_rows(date_field, start, end)],
+            FLAW_SHEET: self.flaw_df.iloc[self.window_rows("releaseDate", start, end)],
+        })
+
+    def memory_usage(self):
+        """
+        各列内存占用（字节，含 object 列实际对象）
+        :return:
+        """
+        usage = self.excel_df.memory_usage(index=False, deep=True)
+        data = [dict(name=column, dtype=str(self.excel_df[column].dtype), bytes=value)
+                for column, value in usage.items()]
+        return data, int(usage.sum())
+
     def count_task_status(self):
         """
         统计已上线数量和未上线数量
         :return:
         """
-        count_status = self.excel_df["taskStatus"].value_counts()
+        count_status = self.pivot_counts("status")
+        count_status = count_status.sort_values(ascending=False, kind="stable")
         # 将数据转为[{"value":num,"name":"已上线"}]的格式
         data = list()
         for index, value in count_status.items():
@@ -102,33 +513,77 @@ class DataWeb:
         # 按人统计已上线数量和未上线数量
         :return:
         """
-        grouped = self.excel_df.groupby(["taskStatus", "realExploiter"]).groups
-        data = dict()
-        keys = []
-        for group_key, group_value in grouped.items():
-            status_task, name = group_key
-            num_task = len(group_value)
-            if name in data:
-                data[name][status_task] = num_task
-            else:
-                data[name] = {"name": name, status_task: num_task}
-            keys.append(status_task)
-        new_data = [value for key, value in data.items()]
-        keys = list(set(keys))
-        keys.insert(0, "name")
-        return new_data, keys
+        return self.format_status_count(self.pivot_counts("status", "person"))
 
     def count_num_module(self):
         """
-        # 按人统计已上线数量和未上线数量
+        # 按模块统计已上线数量和未上线数量
+        :return:
+        """
+        return self.format_status_count(self.pivot_counts("status", "module"))
+
+    @functools.cached_property
+    def count_cube(self):
+        """
+        所有透视维度组合的计数（紧凑类型模式下基于 category 编码分组），
+        任意维度的切片、汇总都从这里取，不再对明细数据 groupby
+        :return: 以 PIVOT_DIMENSIONS 各列为索引的计数 Series
+        """
+        return self.compute_count_cube(self.excel_df)
+
+    @staticmethod
+    def compute_count_cube(df):
+        return df.groupby(list(PIVOT_DIMENSIONS.values()), dropna=False, observed=True).size()
+
+    def pivot_counts(self, *dimensions, filters=None):
+        """
+        从计数立方体按维度汇总
+        :param dimensions: 汇总维度，取 PIVOT_DIMENSIONS 的 key，如 "status", "person"
+        :param filters: 维度 -> 取值列表，取值按字符串比较
+        :return: 以 dimensions 对应列为索引的计数 Series，同一快照上相同参数返回同一对象，调用方不能修改
+        """
+        filters = {dimension: frozenset(str(value) for value in values)
+                   for dimension, values in (filters or dict()).items()}
+        key = (dimensions, tuple(sorted(filters.items(), key=lambda item: item[0])))
+        counts = self._pivot_cache.get(key)
+        if counts is None:
+            counts = self.compute_pivot_counts(dimensions, filters)
+            if len(self._pivot_cache) >= PIVOT_CACHE_SIZE:
+                self._pivot_cache.pop(next(iter(self._pivot_cache), None), None)
+            self._pivot_cache[key] = counts
+        return counts
+
+    def compute_pivot_counts(self, dimensions, filters):
+        cube = self.count_cube
+        for dimension, values in filters.items():
+            level_values = cube.index.get_level_values(PIVOT_DIMENSIONS[dimension])
+            cube = cube[level_values.astype(str).isin(list(values))]
+        levels = [PIVOT_DIMENSIONS[dimension] for dimension in dimensions]
+        return cube.groupby(level=levels, observed=True).sum()
+
+    def pivot(self, rows, columns=None, filters=None):
+        """
+        透视统计：rows 维度为行，columns 维度为列，计数为值
+        :return: [{"name":行取值, 列取值:num,...}] 格式数据及 keys
+        """
+        if columns is None:
+            counts = self.pivot_counts(rows, filters=filters)
+            data = [{"name": name, "数量": value} for name, value in counts.items()]
+            return data, ["name", "数量"]
+        counts = self.pivot_counts(columns, rows, filters=filters)
+        return self.format_status_count(counts)
+
+    @staticmethod
+    def format_status_count(counts):
+        """
+        将 (任务状态, 名称) -> 数量 转为[{"name":名称,"已上线":num,...}]的格式
+        :param counts: 以 (taskStatus, 名称) 为索引的计数 Series，透视时第一层为列维度
         :return:
         """
-        grouped = self.excel_df.groupby(["taskStatus", "projectModule"]).groups
         data = dict()
         keys = []
-        for group_key, group_value in grouped.items():
+        for group_key, num_task in counts.items():
             status_task, name = group_key
-            num_task = len(group_value)
             if name in data:
                 data[name][status_task] = num_task
             else:
@@ -139,51 +594,61 @@ class DataWeb:
         keys.insert(0, "name")
         return new_data, keys
 
-    def date_use_story(self):
+    @functools.cached_property
+    def story_timing(self):
         """
-        # 从Story 维度 分析 开发耗时 测试耗时 整体耗时（立项-上线）
-        :return:
+        Story 各阶段耗时（小时）：一次 groupby 得到每个 story 的合计、最小值、中位数，
+        同一分组上再取 p90；没有有效日期的阶段各项均为空
+        :return: 列为 (耗时名称, sum/min/median/p90) 的 DataFrame，索引为 storyCode
         """
-        df = self.excel_df[self.excel_df["realSubmitTestDate"].notnull()]
+        return self.compute_story_timing(self.excel_df)
+
+    @staticmethod
+    def compute_story_timing(df):
+        df = df[df["realSubmitTestDate"].notnull()]
         df = df[df["realStartDate"].notnull()]
         df = df[df["endDateSit"].notnull()]
-        # 将时间转为时间戳
-        df['realSubmitTestDate'] = df['realSubmitTestDate'].apply(lambda x: x.timestamp())
-        df['realStartDate'] = df['realStartDate'].apply(lambda x: x.timestamp())
-        df['endDateSit'] = df['endDateSit'].apply(lambda x: x.timestamp())
-        # 开发耗时
-        df["useTimeExploit"] = df["realSubmitTestDate"] - df["realStartDate"]
-        # 测试耗时
-        df["useTimeTest"] = df["endDateSit"] - df["realSubmitTestDate"]
-        # 整体耗时
-        df["useTimeTotal"] = df["endDateSit"] - df["realStartDate"]
-
-        # 计算多少小时
-        df["useTimeExploit"] = df["useTimeExploit"] / 3600
-        df["useTimeTest"] = df["useTimeTest"] / 3600
-        df["useTimeTotal"] = df["useTimeTotal"] / 3600
-        df["useTimeExploit"] = df["useTimeExploit"].astype("float")
-        df["useTimeTest"] = df["useTimeTest"].astype("float")
-        df["useTimeTotal"] = df["useTimeTotal"].astype("float")
-        use_time_exploit = df.groupby(["storyCode"])["useTimeExploit"].sum()
-        use_time_test = df.groupby(["storyCode"])["useTimeTest"].sum()
-        use_time_total = df.groupby(["storyCode"])["useTimeTotal"].sum()
-        use_time_static = dict()
-        keys_list = []
-        for key_item, value_item in {
-            "测试耗时": use_time_test,
-            "开发耗时": use_time_exploit,
-            "整体耗时": use_time_total
-        }.items():
-            for key_use, value_use in value_item.items():
-                if key_use in use_time_static:
-                    use_time_static[key_use][key_item] = value_use
-                else:
-                    use_time_static[key_use] = {"name": key_use, key_item: value_use}
-            keys_list.append(key_item)
-        keys_list = list(set(keys_list))
-        keys_list.insert(0, "name")
-        value_list = [value for value in use_time_static.values()]
+        dates = {column: pd.to_datetime(df[column], errors="coerce")
+                 for column in {c for _, start, end in STORY_TIMING for c in (start, end)}}
+        durations = pd.DataFrame({
+            name: (dates[end] - dates[start]) / np.timedelta64(1, "h")
+            for name, start, end in STORY_TIMING
+        })
+        grouped = durations.groupby(df["storyCode"], observed=True)
+        # 某阶段没有任何有效日期的 story 合计为空，而不是 0 小时
+        total = grouped.sum(min_count=1)
+        total.columns = pd.MultiIndex.from_product([total.columns, ["sum"]])
+        timing = grouped.agg(["min", "median"])
+        p90 = grouped.quantile(0.9)
+        p90.columns = pd.MultiIndex.from_product([p90.columns, ["p90"]])
+        return pd.concat([total, timing, p90], axis=1).sort_index(axis=1)
+
+    def date_use_story(self):
+        """
+        # 从Story 维度 分析 开发耗时 测试耗时 UAT耗时 整体耗时（立项-上线）
+        每条数据为各阶段耗时合计，stats 中为该 story 下各条任务耗时的 min/median/p90
+        :return:
+        """
+        return self.format_story_timing(self.story_timing)
+
+    @staticmethod
+    def format_story_timing(timing):
+        """
+        story_timing 转为[{"name":story,"开发耗时":合计,...,"stats":{...}}]的格式
+        :return:
+        """
+        timing = timing.astype(object).where(timing.notna(), None)
+        names = [name for name, _, _ in STORY_TIMING]
+        value_list = list()
+        for story_code, row in timing.iterrows():
+            item = {"name": story_code}
+            item.update({name: row[(name, "sum")] for name in names})
+            item["stats"] = {
+                name: {stat: row[(name, stat)] for stat in ("min", "median", "p90")}
+                for name in names
+            }
+            value_list.append(item)
+        keys_list = ["name"] + names
         return value_list, keys_list
 
     def schedule_story(self):
@@ -191,25 +656,200 @@ class DataWeb:
         按story统计进度（求进度平均值）
         :return:
         """
-        # 进度为空的设置为0
-        self.excel_df.replace({"exploitProgress": np.nan}, 0, inplace=True)
-        group = self.excel_df.groupby(["storyCode"])["exploitProgress"].mean()
         new_data = list()
-        for key, value in group.items():
+        for key, value in self.story_progress.items():
             new_data.append({"name": key, "进度": round(value * 100, 2)})
         keys = ["name", "进度"]
         return new_data, keys
 
+    @functools.cached_property
+    def story_progress(self):
+        """
+        各 story 平均进度，进度为空的按 0 计算
+        :return:
+        """
+        return self.compute_story_progress(self.excel_df)
+
+    @staticmethod
+    def compute_story_progress(df):
+        progress = pd.to_numeric(df["exploitProgress"], errors="coerce").astype("float64").fillna(0)
+        return progress.groupby(df["storyCode"], observed=True).mean()
+
+    def schedule_deviation(self, dimension="person"):
+        """
+        按人或模块统计计划与实际日期的偏差（天，实际晚于计划为正）
+        每条数据为各项偏差的平均值，stats 中为 mean/p50/p90、按期完成比例 onTimeRatio 及有效任务数 count
+        :param dimension: person 或 module
+        :return:
+        """
+        if dimension not in DEVIATION_DIMENSIONS:
+            raise ValueError(f"维度只能是: {','.join(DEVIATION_DIMENSIONS)}")
+        return self.format_deviation(self.deviation[dimension])
+
+    @functools.cached_property
+    def deviation(self):
+        """
+        各维度的偏差统计，日期差只计算一次
+        :return: 维度 -> 列为 (偏差名称, mean/median/p90/onTime/count) 的 DataFrame
+        """
+        return self.compute_deviation(self.excel_df)
+
+    @staticmethod
+    def compute_deviation(df, dimensions=DEVIATION_DIMENSIONS):
+        slip = pd.DataFrame({
+            name: (pd.to_datetime(df[real], errors="coerce") - pd.to_datetime(df[plan], errors="coerce"))
+            / np.timedelta64(1, "D")
+            for name, plan, real in SCHEDULE_DEVIATION
+        })
+        # 计划、实际日期都有的任务才参与按期比例的计算
+        on_time = (slip <= 0).astype("float64").where(slip.notna())
+        result = dict()
+        for dimension in dimensions:
+            keys = df[PIVOT_DIMENSIONS[dimension]]
+            grouped = slip.groupby(keys, observed=True)
+            p90 = grouped.quantile(0.9)
+            p90.columns = pd.MultiIndex.from_product([p90.columns, ["p90"]])
+            ratio = on_time.groupby(keys, observed=True).mean()
+            ratio.columns = pd.MultiIndex.from_product([ratio.columns, ["onTime"]])
+            result[dimension] = pd.concat([grouped.agg(["mean", "median", "count"]), p90, ratio],
+                                          axis=1).sort_index(axis=1)
+        return result
+
+    @staticmethod
+    def format_deviation(stats):
+        """
+        偏差统计转为[{"name":人员,"完成偏差":平均值,...,"stats":{...}}]的格式
+        :return:
+        """
+        stats = stats.round(4)
+        stats = stats.astype(object).where(stats.notna(), None)
+        names = [name for name, _, _ in SCHEDULE_DEVIATION]
+        value_list = list()
+        for key, row in stats.iterrows():
+            item = {"name": key}
+            item.update({name: row[(name, "mean")] for name in names})
+            item["stats"] = {
+                name: {
+                    "mean": row[(name, "mean")],
+                    "p50": row[(name, "median")],
+                    "p90": row[(name, "p90")],
+                    "onTimeRatio": row[(name, "onTime")],
+                    "count": int(row[(name, "count")]),
+                }
+                for name in names
+            }
+            value_list.append(item)
+        keys_list = ["name"] + names
+        return value_list, keys_list
+
+    @functools.cached_property
+    def story_index(self):
+        """
+        Epic编号、Story编号、功能点描述的 n-gram 倒排索引，每个快照只建一次
+        各列以“|”连接，查询词不会跨列匹配
+        :return:
+        """
+        columns = [self.excel_df[column].astype(object) for column in STORY_SEARCH_TEXT_COLUMNS]
+        columns = [column.where(column.notna(), "").astype(str) for column in columns]
+        return NgramIndex(columns[0].str.cat(columns[1:], sep="|").tolist())
+
+    @functools.cached_property
+    def story_records(self):
+        """
+        搜索结果中各行的数据，与索引一起每个快照只转换一次，查询时不再经过 DataFrame
+        :return:
+        """
+        rows = self.excel_df[list(STORY_SEARCH_COLUMNS)].astype(object)
+        return rows.where(rows.notna(), None).to_dict("records")
+
+    def search_stories(self, query, page=1, page_size=20):
+        """
+        按关键词搜索功能点（多个关键词以空格分隔，须同时出现），按相关度排序并分页
+        :return: (当前页数据, 命中总数)
+        """
+        # “|”为列分隔符，按空格处理
+        docs, scores = self.story_index.search(str(query).replace("|", " "))
+        start = (page - 1) * page_size
+        records = self.story_records
+        data = [dict(records[doc], score=round(float(score), 4))
+                for doc, score in zip(docs[start:start + page_size], scores[start:start + page_size])]
+        return data, len(scores)
+
+    @functools.cached_property
+    def row_hashes(self):
+        """
+        每行内容的哈希，用于和新版本数据比对
+        :return:
+        """
+        return pd.util.hash_pandas_object(self.excel_df, index=False)
+
+    def diff_rows(self, other):
+        """
+        与新快照逐行比对（按行内容哈希的多重集合，行顺序变化不算修改）
+        :return: (other 中新增的行, self 中被删除的行)，被修改的行同时出现在两者中
+        """
+        def row_keys(hashes):
+            # 相同内容的行按出现次序区分
+            return pd.MultiIndex.from_arrays([hashes.to_numpy(), hashes.groupby(hashes).cumcount().to_numpy()])
+
+        old_keys = row_keys(self.row_hashes)
+        new_keys = row_keys(other.row_hashes)
+        added = other.excel_df[~new_keys.isin(old_keys)]
+        removed = self.excel_df[~old_keys.isin(new_keys)]
+        return added, removed
+
+    def refresh(self, frames, typed=True):
+        """
+        增量刷新：用新数据构建快照，已在本快照上算好的计数立方体、story 耗时、story 平均进度
+        只按变化的行更新——计数立方体加上新增行、减去删除行的计数，
+        story 耗时和平均进度只重算变化行所属的 story，其余 story 沿用本快照的结果
+        变化超过一半时直接全量计算
+        :param frames: load_projects_frames() 的结果
+        :return: 新的 DataWeb 快照
+        """
+        data_web = DataWeb(typed=typed, frames=frames)
+        added, removed = self.diff_rows(data_web)
+        if len(added) + len(removed) > len(data_web.excel_df) // 2:
+            return data_web
+        aggregates = dict()
+        if "count_cube" in self.__dict__:
+            cube = pd.concat([
+                self.count_cube,
+                self.compute_count_cube(added),
+                -self.compute_count_cube(removed),
+            ])
+            cube = cube.groupby(level=list(range(cube.index.nlevels)), dropna=False, observed=True).sum()
+            aggregates["count_cube"] = cube[cube != 0]
+        changed_stories = pd.unique(pd.concat([added["storyCode"], removed["storyCode"]]).astype(object))
+        changed_df = data_web.excel_df[data_web.excel_df["storyCode"].isin(changed_stories)]
+        story_order = group_order(data_web.excel_df["storyCode"])
+        for name, compute in [("story_timing", self.compute_story_timing),
+                              ("story_progress", self.compute_story_progress)]:
+            if name in self.__dict__:
+                previous = self.__dict__[name]
+                previous = previous[~previous.index.isin(changed_stories)]
+                combined = pd.concat([previous, compute(changed_df)])
+                aggregates[name] = combined.reindex(story_order[story_order.isin(combined.index)])
+        data_web.seed_aggregates(aggregates)
+        return data_web
+
+    def seed_aggregates(self, aggregates):
+        """
+        预先填入 cached_property 的结果（refresh 增量计算得到），之后读取时不再计算
+        :return:
+        """
+        for name, value in aggregates.items():
+            self.__dict__[name] = value
+
     def flaw_count(self):
         """
         按story统计缺陷
         :return:
         """
-        filepath = f"{self.filepath}/TM整体进度表.xlsx"
-        df = pd.read_excel(filepath, header=0, dtype=object, sheet_name="上线内容")
+        df = self.flaw_df
         # 筛选Story不为0的数据
-        df = df[(df["Story"].notna()) & (df["上线类型"] == "修正")]
-        group = df.groupby(["Story"])["上线类型"].count()
+        df = df[(df["storyCode"].notna()) & (df["releaseType"] == "修正")]
+        group = df.groupby(["storyCode"])["releaseType"].count()
         new_data = list()
         keys = ["name", "数量"]
         if df.empty:
@@ -219,3 +859,24 @@ class DataWeb:
             for key, value in group.items():
                 new_data.append({"name": key, "数量": value})
             return new_data, keys
+
+    def dashboard(self, sections=None):
+        """
+        看板数据：一次计算全部（或指定的）统计项
+        状态、人员、模块三项都由 count_cube 汇总，各项派生数据在快照上只计算一次
+        :param sections: 需要的统计项，None 表示全部
+        :return:
+        """
+        sections = list(DASHBOARD_SECTIONS) if sections is None else sections
+        data = dict()
+        if "status" in sections:
+            data["status"] = self.count_task_status()
+        for section, method in [("person", self.count_num_person),
+                                ("module", self.count_num_module),
+                                ("dateUse", self.date_use_story),
+                                ("schedule", self.schedule_story),
+                                ("flaw", self.flaw_count)]:
+            if section in sections:
+                section_data, keys = method()
+                data[section] = dict(data=section_data, keys=keys)
+        return data
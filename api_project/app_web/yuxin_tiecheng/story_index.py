@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""
+:author: keane
+:file  story_index.py
+:time  2026/10/18 17:50
+:desc  功能点描述的字符 n-gram 倒排索引（中文不分词，按单字和相邻两字建索引）
+"""
+import math
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+
+def normalize_text(text):
+    """
+    全角转半角、英文转小写、去掉空白
+    :return:
+    """
+    text = unicodedata.normalize("NFKC", str(text)).lower()
+    return "".join(text.split())
+
+
+def text_grams(text):
+    """
+    文本中的单字和相邻两字
+    :return: n-gram -> 出现次数
+    """
+    grams = defaultdict(int)
+    for i, char in enumerate(text):
+        grams[char] += 1
+        if i + 1 < len(text):
+            grams[text[i:i + 2]] += 1
+    return grams
+
+
+def query_grams(term):
+    """
+    查询词用到的 n-gram：多于一个字时只用两字 gram（更有区分度），单字查询用单字 gram
+    :return:
+    """
+    if len(term) == 1:
+        return [term]
+    return list(dict.fromkeys(term[i:i + 2] for i in range(len(term) - 1)))
+
+
+class NgramIndex:
+    """
+    倒排索引：n-gram -> (包含该 gram 的文档号数组, 对应出现次数数组)，文档号升序
+    查询时从最短的倒排表开始求交集，再用原文确认查询词连续出现，按长度归一的 tf-idf 排序
+    """
+
+    def __init__(self, texts, doc_count=None, doc_freqs=None):
+        """
+        :param texts: 文档文本序列，文档号为其位置，空值不建索引
+        :param doc_count: 只对语料的一部分建索引时传入全量语料的文档数，idf 按全量语料计算
+        :param doc_freqs: 全量语料中各 gram 的文档频率，未给出的 gram 按本索引统计
+        """
+        self.texts = [None if text is None else normalize_text(text) for text in texts]
+        postings = defaultdict(lambda: ([], []))
+        for doc, text in enumerate(self.texts):
+            if not text:
+                continue
+            for gram, count in text_grams(text).items():
+                docs, counts = postings[gram]
+                docs.append(doc)
+                counts.append(count)
+        self.postings = {
+            gram: (np.asarray(docs, dtype=np.int64), np.asarray(counts, dtype=np.float64))
+            for gram, (docs, counts) in postings.items()
+        }
+        self.doc_count = sum(1 for text in self.texts if text) if doc_count is None else doc_count
+        self.doc_freqs = doc_freqs or dict()
+        self.lengths = np.asarray([len(text) if text else 1 for text in self.texts], dtype=np.float64)
+
+    def search(self, query):
+        """
+        查询：空白分隔的多个词须同时出现
+        :return: (按得分降序的文档号数组, 对应得分数组)
+        """
+        terms = [normalize_text(term) for term in str(query).split()]
+        terms = [term for term in terms if term]
+        if not terms:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        grams = list(dict.fromkeys(gram for term in terms for gram in query_grams(term)))
+        if any(gram not in self.postings for gram in grams):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        grams.sort(key=lambda gram: len(self.postings[gram][0]))
+        candidates = self.postings[grams[0]][0]
+        for gram in grams[1:]:
+            if not len(candidates):
+                break
+            candidates = np.intersect1d(candidates, self.postings[gram][0], assume_unique=True)
+        # 两字 gram 都出现不代表查询词连续出现，用原文确认
+        candidates = np.asarray(
+            [doc for doc in candidates if all(term in self.texts[doc] for term in terms)], dtype=np.int64
+        )
+        scores = np.zeros(len(candidates))
+        for gram in grams:
+            docs, counts = self.postings[gram]
+            idf = math.log(1 + self.doc_count / self.doc_freqs.get(gram, len(docs)))
+            scores += counts[np.searchsorted(docs, candidates)] * idf
+        # 长描述中出现次数自然更多，按长度平方根归一
+        scores /= np.sqrt(self.lengths[candidates])
+        order = np.lexsort((candidates, -scores))
+        return candidates[order], scores[order]
@@ -0,0 +1,154 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""
+:author: keane
+:file  versions.py
+:time  2026/10/18 17:05
+:desc  进度表版本记录与趋势统计：每个版本只保存相对上一版本变化的行，
+       按天的状态数量、平均进度由各版本的变化累加得到
+"""
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+from django.db import IntegrityError, transaction
+from django.db.models import ExpressionWrapper, F, FloatField, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from app_web.models import ProgressVersion, ProgressVersionRow
+from app_web.yuxin_tiecheng.data_orm import char_value
+from app_web.yuxin_tiecheng.data_web import DataWeb
+
+# 视为已完成的任务状态，趋势中“剩余”为其余状态的任务数
+DONE_STATUS = "已上线"
+
+
+def version_rows(df, sign):
+    """
+    变化的行转为 ProgressVersionRow（未关联版本）
+    :return:
+    """
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy().view("int64")
+    records = json.loads(df.to_json(orient="records", date_format="iso", force_ascii=False))
+    rows = list()
+    for row_hash, record in zip(hashes, records):
+        rows.append(ProgressVersionRow(
+            sign=sign,
+            row_hash=int(row_hash),
+            source_project=record.get("sourceProject"),
+            story_code=None if record.get("storyCode") is None else char_value(record["storyCode"]),
+            task_status=record.get("taskStatus"),
+            exploit_progress=record.get("exploitProgress"),
+            data=record,
+        ))
+    return rows
+
+
+def live_hashes():
+    """
+    最新版本的行内容哈希多重集合：各版本变化累加后数量大于 0 的哈希
+    :return: 哈希 -> 行数
+    """
+    rows = ProgressVersionRow.objects.values("row_hash").annotate(n=Sum("sign")).filter(n__gt=0)
+    return pd.Series({row["row_hash"]: row["n"] for row in rows}, dtype="int64")
+
+
+def record_version(df):
+    """
+    记录新版本：与最新版本按行内容哈希比对，只保存新增行和删除行
+    内容与最新版本相同时不记录；多个进程同时记录同一次变化时只有一个成功
+    :param df: “新版”sheet 数据（DataWeb.excel_df 或 load_projects_frames() 的结果）
+    :return: 新版本，没有记录时为 None
+    """
+    df = DataWeb.to_typed_frame(df).reset_index(drop=True)
+    hashes = pd.Series(pd.util.hash_pandas_object(df, index=False).to_numpy().view("int64"))
+    digest = hashlib.md5(np.sort(hashes.to_numpy()).tobytes()).hexdigest()
+    try:
+        with transaction.atomic():
+            parent = ProgressVersion.objects.order_by("-id").first()
+            if parent is not None and parent.digest == digest:
+                return None
+            previous = live_hashes()
+            # 同一哈希的行按出现次序编号，编号不小于上一版本中该哈希行数的为新增行
+            previous_count = previous.reindex(hashes.to_numpy()).fillna(0).to_numpy()
+            added = df[hashes.groupby(hashes).cumcount().to_numpy() >= previous_count]
+            removed_count = previous.sub(hashes.value_counts(), fill_value=0)
+            removed_count = removed_count[removed_count > 0].astype("int64")
+
+            rows = version_rows(added, 1)
+            if len(removed_count):
+                # 删除行的内容取自之前新增该哈希时保存的行
+                removed_rows = dict()
+                for row in ProgressVersionRow.objects.filter(
+                        row_hash__in=[int(row_hash) for row_hash in removed_count.index], sign=1):
+                    removed_rows.setdefault(row.row_hash, row)
+                for row_hash, count in removed_count.items():
+                    row = removed_rows[int(row_hash)]
+                    rows.extend(ProgressVersionRow(
+                        sign=-1, row_hash=row.row_hash, source_project=row.source_project,
+                        story_code=row.story_code, task_status=row.task_status,
+                        exploit_progress=row.exploit_progress, data=row.data,
+                    ) for _ in range(count))
+
+            version = ProgressVersion.objects.create(
+                parent=parent, digest=digest, row_count=len(df),
+                added_count=len(added), removed_count=int(removed_count.sum()),
+            )
+            for row in rows:
+                row.version = version
+            ProgressVersionRow.objects.bulk_create(rows, batch_size=500)
+            return version
+    except IntegrityError:
+        return None
+
+
+def progress_trend(start=None, end=None):
+    """
+    按天统计各任务状态数量、总数、剩余（未完成）数量和平均进度（空进度按 0 计，与 schedule_story 一致）
+    每天取当天最后一个版本，没有新版本的日期沿用之前的版本，第一个版本之前的日期不返回
+    :param start: 开始日期，默认为结束日期前 30 天
+    :param end: 结束日期（包含当天），默认为今天
+    :return: ([{"date":"2026-10-01","已上线":30,...,"总数":143,"剩余":113,"平均进度":54.57}], keys)
+    """
+    end = pd.Timestamp(end or timezone.localdate()).normalize()
+    start = pd.Timestamp(start).normalize() if start else end - pd.Timedelta(days=30)
+    if start > end:
+        raise ValueError("start 不能晚于 end")
+    end_time = timezone.make_aware((end + pd.Timedelta(days=1)).to_pydatetime())
+    versions = ProgressVersion.objects.filter(loaded_at__lt=end_time).order_by("id")
+    loaded_days = pd.Series({
+        version_id: pd.Timestamp(timezone.localtime(loaded_at).date())
+        for version_id, loaded_at in versions.values_list("id", "loaded_at")
+    }, dtype="datetime64[ns]")
+    if loaded_days.empty:
+        return [], ["date", "总数", "剩余", "平均进度"]
+    rows = ProgressVersionRow.objects.filter(version__in=versions).values("version_id", "task_status").annotate(
+        n=Sum("sign"),
+        progress=Sum(ExpressionWrapper(F("sign") * Coalesce("exploit_progress", Value(0.0)),
+                                       output_field=FloatField())),
+    )
+    changes = pd.DataFrame.from_records(list(rows), columns=["version_id", "task_status", "n", "progress"])
+
+    # 各版本变化累加为各版本的状态，再按天取最后一个版本
+    version_ids = loaded_days.index
+    counts = changes.pivot_table(index="version_id", columns="task_status", values="n", aggfunc="sum",
+                                 fill_value=0).reindex(version_ids, fill_value=0).cumsum()
+    totals = changes.groupby("version_id")[["n", "progress"]].sum().reindex(version_ids, fill_value=0).cumsum()
+    states = counts.assign(总数=totals["n"])
+    states["剩余"] = states["总数"] - (states[DONE_STATUS] if DONE_STATUS in states else 0)
+    states["平均进度"] = (totals["progress"] / totals["n"].where(totals["n"] > 0) * 100).round(2)
+    states = states.groupby(loaded_days.to_numpy()).last()
+    states = states.reindex(pd.date_range(min(start, states.index.min()), end)).ffill()
+    states = states.loc[start:end].dropna(how="all")
+
+    keys = ["date"] + list(counts.columns) + ["总数", "剩余", "平均进度"]
+    new_data = list()
+    for day, state in states.iterrows():
+        item = {"date": day.strftime("%Y-%m-%d")}
+        for key in keys[1:-1]:
+            item[key] = int(state[key])
+        item["平均进度"] = None if pd.isna(state["平均进度"]) else float(state["平均进度"])
+        new_data.append(item)
+    return new_data, keys
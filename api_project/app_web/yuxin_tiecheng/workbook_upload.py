@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+"""
+:author: keane
+:file  workbook_upload.py
+:time  2026/10/18 16:30
+:desc  进度工作簿上传：上传文件暂存到工作簿所在目录，后台线程解析校验后原子替换工作簿并切换快照
+       任务状态保存在数据库（WorkbookUpload）中，上传与查询状态可以落在不同进程、不同节点
+       多节点部署时 YUXIN_BACKEND 为 "pandas" 的前提是 YUXIN_WORKBOOKS 在各节点共享的存储上：
+       上传只替换接收请求的节点看到的工作簿，其他节点按工作簿签名发现变化后重新加载；
+       不能共享存储时使用 "orm" 后端，上传的数据导入数据库，各节点读到的都是同一份
+"""
+import logging
+import os
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.db import connection, transaction
+
+from app_web.models import WorkbookUpload
+from app_web.yuxin_tiecheng.data_web import WORKBOOK_PATH, install_workbook
+
+logger = logging.getLogger(__name__)
+
+# 暂存目录，位于工作簿所在目录下，保证替换时在同一文件系统
+STAGING_DIR = ".upload"
+# 保留最近的上传任务状态条数
+MAX_UPLOAD_JOBS = 100
+
+# 单线程依次处理上传，同一进程收到的多次上传按提交顺序切换快照
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yuxin-upload")
+
+
+def upload_target(filename, workbooks=WORKBOOK_PATH):
+    """
+    上传文件对应的线上工作簿：配置为目录时放入该目录，配置为文件时替换同名文件，
+    只配置了一个文件时直接替换该文件
+    :return:
+    """
+    name = os.path.basename(filename or "")
+    if not name.endswith(".xlsx") or name.startswith("~$"):
+        raise ValueError("只支持上传 .xlsx 工作簿")
+    sources = [workbooks] if isinstance(workbooks, (str, os.PathLike)) else list(workbooks)
+    for source in sources:
+        if os.path.isdir(source):
+            return os.path.join(source, name)
+        if os.path.basename(source) == name:
+            return os.fspath(source)
+    if len(sources) == 1:
+        return os.fspath(sources[0])
+    raise ValueError(f"工作簿 {name} 不在 YUXIN_WORKBOOKS 中")
+
+
+def get_upload_job(job_id):
+    job = WorkbookUpload.objects.filter(pk=job_id).first()
+    return job.to_dict() if job is not None else None
+
+
+def _update_job(job_id, **kwargs):
+    WorkbookUpload.objects.filter(pk=job_id).update(**kwargs)
+
+
+def _prune_jobs():
+    """只保留最近 MAX_UPLOAD_JOBS 条任务，未结束的任务不删除"""
+    keep = WorkbookUpload.objects.order_by("-created_at").values_list("pk", flat=True)[:MAX_UPLOAD_JOBS]
+    WorkbookUpload.objects.filter(status__in=("done", "failed")).exclude(pk__in=list(keep)).delete()
+
+
+def _run_upload(job_id, staged_path, target_path):
+    _update_job(job_id, status="parsing")
+    try:
+        rows = install_workbook(staged_path, target_path)
+    except Exception as e:
+        logger.exception("工作簿 %s 上传失败", target_path)
+        _update_job(job_id, status="failed", reason=f"{e}")
+    else:
+        _update_job(job_id, status="done", rows=rows)
+    finally:
+        shutil.rmtree(os.path.dirname(staged_path), ignore_errors=True)
+        # 后台线程不经过请求周期，需自行关闭数据库连接
+        connection.close()
+
+
+def submit_upload(uploaded_file):
+    """
+    上传文件移动到暂存目录（与线上工作簿同名），提交后台解析，立即返回任务状态
+    uploaded_file 须为 TemporaryUploadedFile，已按块写入磁盘，移动时不读入内存
+    :return: 任务状态
+    """
+    workbooks = getattr(settings, "YUXIN_WORKBOOKS", WORKBOOK_PATH)
+    max_size = getattr(settings, "YUXIN_UPLOAD_MAX_SIZE", None)
+    if max_size and uploaded_file.size > max_size:
+        raise ValueError(f"工作簿不能超过 {max_size} 字节")
+    target_path = upload_target(uploaded_file.name, workbooks)
+    job_id = uuid.uuid4().hex
+    staging_dir = os.path.join(os.path.dirname(os.path.abspath(target_path)), STAGING_DIR, job_id)
+    os.makedirs(staging_dir)
+    staged_path = os.path.join(staging_dir, os.path.basename(target_path))
+    file_move_safe(uploaded_file.temporary_file_path(), staged_path, allow_overwrite=True)
+
+    job = WorkbookUpload.objects.create(
+        id=job_id, name=os.path.basename(target_path), size=uploaded_file.size, status="pending")
+    _prune_jobs()
+    # 在事务中调用时等任务提交后再解析，后台线程一定能查到该任务
+    transaction.on_commit(lambda: _executor.submit(_run_upload, job_id, staged_path, target_path))
+    return job.to_dict()